@@ -48,7 +48,7 @@ from config import DB_CONFIG
 from flask_cors import CORS
 
 from scheduler.core.genetic_scheduler import otimizar_horario_genetico
-from scheduler.core.horario_ml import HorarioML
+from scheduler.core.horario_ml import obter_modelo_compartilhado
 
 app = Flask(__name__, 
     template_folder='../frontend',
@@ -287,6 +287,9 @@ def salvar_disponibilidades():
         # Salvar CSV atualizado
         df.to_csv(csv_path, index=False)
         
+        # Atualizar máscaras de disponibilidade usadas pelo modelo de ML
+        obter_modelo_compartilhado(DATA_PATH).recarregar_lookups()
+        
         return jsonify({
             "message": "Disponibilidades salvas com sucesso!", 
             "total_professores_atualizados": total_atualizados
@@ -347,6 +350,9 @@ def salvar_restricoes():
         # Salvar CSV atualizado
         df.to_csv(csv_path, index=False)
         
+        # Atualizar máscaras de restrição usadas pelo modelo de ML
+        obter_modelo_compartilhado(DATA_PATH).recarregar_lookups()
+        
         return jsonify({
             "message": "Restrições salvas com sucesso!", 
             "total_disciplinas_atualizadas": total_atualizadas
@@ -600,10 +606,10 @@ def gerar_horario_genetico():
         _ultimo_progresso = 0
         
         # Inicializar ML
-        ml_model = HorarioML(DATA_PATH)
+        ml_model = obter_modelo_compartilhado(DATA_PATH)
         
-        # Treinar modelo de ML
-        ml_model.treinar_modelo()
+        # Atualizar modelo de ML em segundo plano (a geração usa o modelo atual)
+        ml_model.treinar_em_segundo_plano()
         
         # Gerar horário
         schedule_generator = ScheduleGenerator(DATA_PATH, ml_model=ml_model)
@@ -654,17 +660,14 @@ def validar_conflito():
 def obter_metricas_ml():
     """Retorna métricas do modelo de ML"""
     try:
-        ml_model = HorarioML(DATA_PATH)
+        ml_model = obter_modelo_compartilhado(DATA_PATH)
         
-        # Caminho para o arquivo de histórico
-        historico_path = os.path.join(DATA_PATH, 'historico_horarios.csv')
-        
-        # Verificar se o arquivo de histórico existe
-        if not os.path.exists(historico_path):
-            return jsonify({"error": "Arquivo de histórico não encontrado"}), 404
+        # Scores do histórico de treinamento (segmento mapeado em memória)
+        _, scores = ml_model.historico.carregar_matriz()
         
-        # Carregar histórico
-        historico_df = pd.read_csv(historico_path)
+        # Verificar se há histórico registrado
+        if not len(scores):
+            return jsonify({"error": "Histórico de horários vazio"}), 404
         
         # Verificar se o arquivo do modelo existe
         modelo_path = os.path.join(DATA_PATH, 'modelo_horario.joblib')
@@ -672,10 +675,10 @@ def obter_metricas_ml():
             return jsonify({"error": "Arquivo do modelo não encontrado"}), 404
         
         metricas = {
-            'total_horarios_gerados': len(historico_df),
-            'score_medio': float(historico_df['score'].mean()),
-            'score_maximo': float(historico_df['score'].max()),
-            'evolucao_scores': historico_df['score'].tolist()[-10:],  # últimos 10 scores
+            'total_horarios_gerados': int(len(scores)),
+            'score_medio': float(scores.mean()),
+            'score_maximo': float(scores.max()),
+            'evolucao_scores': scores[-10:].tolist(),  # últimos 10 scores
             'data_ultimo_treino': os.path.getmtime(modelo_path)
         }
         
@@ -687,12 +690,13 @@ def obter_metricas_ml():
 
 @app.route('/api/ml/treinar', methods=['POST'])
 def treinar_modelo():
-    """Força um novo treinamento do modelo"""
+    """Força um novo treinamento do modelo (executado em segundo plano)"""
     try:
-        ml_model = HorarioML(DATA_PATH)
-        ml_model.treinar_modelo()
+        ml_model = obter_modelo_compartilhado(DATA_PATH)
+        if not ml_model.treinar_em_segundo_plano():
+            return jsonify({"message": "Treinamento já em andamento"}), 409
         
-        return jsonify({"message": "Modelo treinado com sucesso"}), 200
+        return jsonify({"message": "Treinamento iniciado em segundo plano"}), 202
         
     except Exception as e:
         print(f"❌ Erro ao treinar modelo: {e}")
@@ -702,7 +706,7 @@ def treinar_modelo():
 def obter_analise_ml():
     """Retorna análise completa do sistema de ML"""
     try:
-        ml_model = HorarioML(DATA_PATH)
+        ml_model = obter_modelo_compartilhado(DATA_PATH)
         
         relatorio = ml_model.obter_relatorio_aprendizado()
         tendencias = ml_model.analisar_tendencias()
@@ -721,7 +725,7 @@ def obter_analise_ml():
 def obter_tendencias_ml():
     """Retorna análise de tendências do sistema"""
     try:
-        ml_model = HorarioML(DATA_PATH)
+        ml_model = obter_modelo_compartilhado(DATA_PATH)
         tendencias = ml_model.analisar_tendencias()
         
         return jsonify({
@@ -737,7 +741,7 @@ def obter_tendencias_ml():
 def obter_historico_ml():
     """Retorna histórico de treinamento do modelo"""
     try:
-        ml_model = HorarioML(DATA_PATH)
+        ml_model = obter_modelo_compartilhado(DATA_PATH)
         historico_path = os.path.join(DATA_PATH, 'historico_treinamento.json')
         
         if not os.path.exists(historico_path):
@@ -0,0 +1,73 @@
+from typing import Dict, Any
+
+import numpy as np
+
+
+class AnalisadorConflitos:
+    def __init__(self, restricoes: np.ndarray, limite_diario: int = 4):
+        """
+        Analisa conflitos de um turno inteiro em uma única passagem vetorizada
+
+        :param restricoes: Máscara [disciplinas, 5, 7] (True = horário restrito para a disciplina);
+                           IDs de disciplina fora da máscara são considerados sem restrição
+        :param limite_diario: Máximo de aulas por professor em um dia
+        """
+        self.restricoes = np.asarray(restricoes, dtype=bool)
+        self.limite_diario = limite_diario
+
+    def analisar(self, professores: np.ndarray, disciplinas: np.ndarray) -> Dict[str, Any]:
+        """
+        Recebe as grades [turmas, 5, 7] de professores e disciplinas (disciplina -1 = slot vazio)
+
+        Retorna 'contagens' por tipo de conflito e 'celulas' com as posições exatas:
+        (turma, dia, hora) para sobreposições e restrições, (professor, dia, hora) para janelas
+        e (professor, dia) para excesso de carga diária.
+        """
+        professores = np.asarray(professores, dtype=np.int64)
+        disciplinas = np.asarray(disciplinas, dtype=np.int64)
+        num_dias, aulas_por_dia = disciplinas.shape[1:]
+        slots = num_dias * aulas_por_dia
+
+        ocupado = disciplinas >= 0
+        com_professor = ocupado & (professores >= 0)
+        num_professores = int(professores[com_professor].max()) + 1 if com_professor.any() else 0
+
+        # Sobreposição: bincount sobre (professor, slot)
+        slot = np.arange(slots).reshape(num_dias, aulas_por_dia)
+        chaves = np.where(com_professor, professores * slots + slot, -1)
+        ocupacao = np.bincount(chaves[com_professor], minlength=num_professores * slots)
+        sobrepostas = com_professor & (ocupacao[np.maximum(chaves, 0)] > 1) \
+            if num_professores else np.zeros_like(ocupado)
+        total_sobreposicao = int(np.maximum(ocupacao - 1, 0).sum())
+
+        # Janelas e carga por professor-dia
+        ocupacao_prof = ocupacao.reshape(num_professores, num_dias, aulas_por_dia) > 0
+        aulas_dia = ocupacao.reshape(num_professores, num_dias, aulas_por_dia).sum(axis=-1)
+        tem_aulas = ocupacao_prof.any(axis=-1)
+        primeira = ocupacao_prof.argmax(axis=-1)
+        ultima = aulas_por_dia - 1 - ocupacao_prof[..., ::-1].argmax(axis=-1)
+        horas = np.arange(aulas_por_dia)
+        dentro = tem_aulas[..., None] & (horas >= primeira[..., None]) & (horas <= ultima[..., None])
+        janelas = dentro & ~ocupacao_prof
+        excedidos = aulas_dia > self.limite_diario
+
+        # Restrições: máscara da disciplina no slot
+        conhecida = ocupado & (disciplinas < len(self.restricoes))
+        restritas = np.zeros_like(ocupado)
+        indices = np.nonzero(conhecida)
+        restritas[indices] = self.restricoes[disciplinas[indices], indices[1], indices[2]]
+
+        return {
+            'contagens': {
+                'sobreposicao_professor': total_sobreposicao,
+                'janela_excessiva': int(janelas.sum()),
+                'restricao_violada': int(restritas.sum()),
+                'carga_horaria_excedida': int(excedidos.sum())
+            },
+            'celulas': {
+                'sobreposicao_professor': np.argwhere(sobrepostas),
+                'janela_excessiva': np.argwhere(janelas),
+                'restricao_violada': np.argwhere(restritas),
+                'carga_horaria_excedida': np.argwhere(excedidos)
+            }
+        }
@@ -0,0 +1,51 @@
+import os
+import pickle
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+
+class CheckpointGA:
+    def __init__(self, diretorio: str, assinatura: str):
+        """
+        Persistência periódica do estado do algoritmo genético
+
+        :param diretorio: Pasta onde os checkpoints são gravados
+        :param assinatura: Identificador do problema (turmas/disciplinas/professores)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.assinatura = assinatura
+        self.caminho = os.path.join(diretorio, f'ga_{assinatura}.pkl')
+        os.makedirs(diretorio, exist_ok=True)
+
+    def salvar(self, estado: Dict[str, Any]):
+        """Grava o estado de forma atômica (arquivo temporário + rename)"""
+        estado = dict(estado, assinatura=self.assinatura, timestamp=datetime.now().isoformat())
+        temporario = f'{self.caminho}.tmp'
+        try:
+            with open(temporario, 'wb') as f:
+                pickle.dump(estado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, self.caminho)
+        except Exception as e:
+            self.logger.error(f"Erro ao salvar checkpoint: {e}")
+
+    def carregar(self) -> Optional[Dict[str, Any]]:
+        """Carrega o último checkpoint compatível com a assinatura, se existir"""
+        if not os.path.exists(self.caminho):
+            return None
+        try:
+            with open(self.caminho, 'rb') as f:
+                estado = pickle.load(f)
+        except Exception as e:
+            self.logger.error(f"Erro ao carregar checkpoint: {e}")
+            return None
+
+        if estado.get('assinatura') != self.assinatura:
+            self.logger.warning("Checkpoint ignorado: assinatura do problema diferente")
+            return None
+        return estado
+
+    def remover(self):
+        """Remove o checkpoint após a conclusão da execução"""
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
@@ -0,0 +1,120 @@
+import time
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional
+
+
+class CircuitBreaker:
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    SEMI_ABERTO = 'semi_aberto'
+
+    def __init__(self,
+                 nome: str,
+                 limite_falhas: int = 3,
+                 tempo_reabertura: float = 30.0,
+                 sonda: Optional[Callable[[], Any]] = None):
+        """
+        Disjuntor para chamadas de ML: após falhas seguidas, as chamadas vão direto ao fallback
+
+        Aberto, nenhuma chamada é tentada (a falha custa só a consulta ao estado). Passado
+        tempo_reabertura, a sonda é executada em uma thread de fundo e fecha o circuito se
+        tiver sucesso; sem sonda, uma única chamada real é liberada como teste (semi-aberto).
+
+        :param nome: Identificação usada nos logs e no relatório
+        :param limite_falhas: Falhas seguidas que abrem o circuito
+        :param tempo_reabertura: Segundos de espera antes de testar o caminho de ML novamente
+        :param sonda: Função sem argumentos que exercita o caminho de ML (exceção = falha)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_reabertura = tempo_reabertura
+        self.sonda = sonda
+
+        self._lock = threading.Lock()
+        self.estado = self.FECHADO
+        self.falhas_seguidas = 0
+        self.aberto_em = None
+        self.sondando = False
+
+        self.total_falhas = 0
+        self.total_rejeitadas = 0
+        self.aberturas = 0
+        self.ultimo_erro = None
+
+    def permitir(self) -> bool:
+        """Indica se a chamada de ML deve ser tentada agora"""
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return True
+
+            if self.estado == self.ABERTO and time.monotonic() - self.aberto_em >= self.tempo_reabertura:
+                if self.sonda is not None:
+                    if not self.sondando:
+                        self.sondando = True
+                        threading.Thread(target=self._executar_sonda, daemon=True,
+                                         name=f'sonda-{self.nome}').start()
+                else:
+                    # Liberar só esta chamada como teste
+                    self.estado = self.SEMI_ABERTO
+                    return True
+
+            self.total_rejeitadas += 1
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self.estado != self.FECHADO:
+                self.logger.info(f"Circuito '{self.nome}' fechado: caminho de ML recuperado")
+            self.estado = self.FECHADO
+            self.falhas_seguidas = 0
+
+    def registrar_falha(self, erro: Exception = None):
+        with self._lock:
+            self.falhas_seguidas += 1
+            self.total_falhas += 1
+            self.ultimo_erro = str(erro) if erro is not None else None
+
+            if self.estado == self.SEMI_ABERTO or self.falhas_seguidas >= self.limite_falhas:
+                if self.estado != self.ABERTO:
+                    self.aberturas += 1
+                    self.logger.warning(
+                        f"Circuito '{self.nome}' aberto após {self.falhas_seguidas} falhas: {erro}"
+                    )
+                self.estado = self.ABERTO
+                self.aberto_em = time.monotonic()
+
+    def fechar(self):
+        """Fecha o circuito manualmente (ex.: após instalar um modelo novo)"""
+        with self._lock:
+            self.estado = self.FECHADO
+            self.falhas_seguidas = 0
+
+    def _executar_sonda(self):
+        try:
+            self.sonda()
+        except Exception as e:
+            with self._lock:
+                self.ultimo_erro = str(e)
+                self.aberto_em = time.monotonic()
+        else:
+            self.registrar_sucesso()
+        finally:
+            with self._lock:
+                self.sondando = False
+
+    def obter_estado(self) -> Dict[str, Any]:
+        """Retorna estado e contadores do circuito para relatórios"""
+        with self._lock:
+            return {
+                'nome': self.nome,
+                'estado': self.estado,
+                'falhas_seguidas': self.falhas_seguidas,
+                'total_falhas': self.total_falhas,
+                'chamadas_rejeitadas': self.total_rejeitadas,
+                'aberturas': self.aberturas,
+                'ultimo_erro': self.ultimo_erro,
+                'segundos_ate_sonda': max(0.0, self.tempo_reabertura - (time.monotonic() - self.aberto_em))
+                if self.estado == self.ABERTO else 0.0
+            }
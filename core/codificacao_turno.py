@@ -0,0 +1,492 @@
+import random
+import time
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any
+
+from .analisador_conflitos import AnalisadorConflitos
+from .mascaras import montar_mascara
+
+
+class CodificacaoTurno:
+    def __init__(self, professores_df: pd.DataFrame, turmas: Dict[str, Dict[str, Any]],
+                 disciplinas_df: pd.DataFrame = None):
+        """
+        Codificação conjunta de todas as aulas de um turno em um único cromossomo
+
+        Cada gene representa um slot (turma, dia, hora) e guarda o índice de uma
+        opção de aula (disciplina + professor habilitado) ou -1 para slot vago.
+
+        :param professores_df: DataFrame de professores/disciplinas/turmas
+        :param turmas: Dicionário turma -> {'disciplinas': [...]} com uma disciplina por aula
+        :param disciplinas_df: DataFrame de disciplinas.csv com as colunas r_ de restrição; sem ele,
+                               usam-se as colunas r_ de professores_df
+        """
+        self.dias = ['seg', 'ter', 'qua', 'qui', 'sex']
+        self.num_dias = 5
+        self.aulas_por_dia = 7
+        self.num_slots = self.num_dias * self.aulas_por_dia
+
+        self.turmas = list(turmas.keys())
+        self.num_turmas = len(self.turmas)
+        self.professores = sorted(professores_df['nome'].dropna().unique())
+        self.prof_idx = {nome: i for i, nome in enumerate(self.professores)}
+
+        # Aulas de cada turma (multiconjunto de disciplinas)
+        self.disciplinas = []
+        self.disc_idx = {}
+        self.aulas_turma = []
+        for turma in self.turmas:
+            aulas = []
+            for disciplina in list(turmas[turma]['disciplinas'])[:self.num_slots]:
+                if disciplina not in self.disc_idx:
+                    self.disc_idx[disciplina] = len(self.disciplinas)
+                    self.disciplinas.append(disciplina)
+                aulas.append(self.disc_idx[disciplina])
+            self.aulas_turma.append(aulas)
+
+        # Genes: posição t * 35 + s -> turma t, dia s // 7, hora s % 7
+        self.num_genes = self.num_turmas * self.num_slots
+        self.gene_turma = np.repeat(np.arange(self.num_turmas, dtype=np.int32), self.num_slots)
+        self.gene_slot = np.tile(np.arange(self.num_slots, dtype=np.int32), self.num_turmas)
+        self.gene_dia = self.gene_slot // self.aulas_por_dia
+        self.gene_hora = self.gene_slot % self.aulas_por_dia
+
+        # Máscaras de disponibilidade [professor, dia, hora] e restrição [disciplina, dia, hora]
+        self.disponibilidade = montar_mascara(
+            professores_df.drop_duplicates(subset=['nome']).set_index('nome'),
+            self.professores, 'd_', self.dias, self.aulas_por_dia
+        )
+        self.restricoes = montar_mascara(
+            (disciplinas_df if disciplinas_df is not None else professores_df)
+            .drop_duplicates(subset=['disciplina']).set_index('disciplina'),
+            self.disciplinas, 'r_', self.dias, self.aulas_por_dia
+        )
+        self.analisador = AnalisadorConflitos(self.restricoes)
+
+        # Opções de aula (turma, disciplina, professor habilitado)
+        self._montar_opcoes(professores_df)
+
+        # Carga exigida por (turma, disciplina) para verificar o cromossomo
+        self.carga_exigida = np.zeros(self.num_turmas * max(len(self.disciplinas), 1), dtype=np.int64)
+        for t, aulas in enumerate(self.aulas_turma):
+            for d in aulas:
+                self.carga_exigida[t * len(self.disciplinas) + d] += 1
+
+    def assinatura(self) -> str:
+        """Identificador estável do problema codificado (turmas, aulas e professores)"""
+        conteudo = json.dumps({
+            'turmas': self.turmas,
+            'aulas': [[self.disciplinas[d] for d in aulas] for aulas in self.aulas_turma],
+            'professores': list(self.professores),
+            'opcoes': self.opcao_professor.tolist()
+        }, ensure_ascii=False)
+        return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:16]
+
+    def _montar_opcoes(self, professores_df: pd.DataFrame):
+        """Pré-calcula as opções de aula e os professores habilitados por disciplina/turma"""
+        por_turma = {}
+        por_disciplina = {}
+        for nome, disciplina, turma in professores_df[['nome', 'disciplina', 'turma']].itertuples(index=False):
+            if nome not in self.prof_idx:
+                continue
+            por_turma.setdefault((disciplina, turma), set()).add(self.prof_idx[nome])
+            por_disciplina.setdefault(disciplina, set()).add(self.prof_idx[nome])
+
+        opcao_turma, opcao_disciplina, opcao_professor = [], [], []
+        self.opcoes_aula = {}  # (turma, disciplina) -> índices das opções
+        for t, aulas in enumerate(self.aulas_turma):
+            for d in sorted(set(aulas)):
+                disciplina = self.disciplinas[d]
+                profs = por_turma.get((disciplina, self.turmas[t])) or por_disciplina.get(disciplina) or {-1}
+                inicio = len(opcao_turma)
+                for p in sorted(profs):
+                    opcao_turma.append(t)
+                    opcao_disciplina.append(d)
+                    opcao_professor.append(p)
+                self.opcoes_aula[(t, d)] = np.arange(inicio, len(opcao_turma), dtype=np.int32)
+
+        self.opcao_turma = np.array(opcao_turma, dtype=np.int32)
+        self.opcao_disciplina = np.array(opcao_disciplina, dtype=np.int32)
+        self.opcao_professor = np.array(opcao_professor, dtype=np.int32)
+
+        # Alternativas de cada opção: mesma aula com outro professor habilitado
+        self.alternativas = [
+            self.opcoes_aula[(int(t), int(d))].tolist()
+            for t, d in zip(self.opcao_turma, self.opcao_disciplina)
+        ]
+
+    def criar_individuo(self) -> List[int]:
+        """Cria um cromossomo alocando as aulas de cada turma evitando choques e indisponibilidades"""
+        individuo = [-1] * self.num_genes
+        ocupados = set()  # (professor, slot) já utilizados
+        carga_professor = {}
+
+        for t in random.sample(range(self.num_turmas), self.num_turmas):
+            livres = list(range(self.num_slots))
+            random.shuffle(livres)
+
+            # Um professor por disciplina da turma, preferindo o de menor carga
+            opcao_escolhida = {}
+            for d in set(self.aulas_turma[t]):
+                opcoes = self.opcoes_aula[(t, d)].tolist()
+                opcao_escolhida[d] = min(
+                    opcoes,
+                    key=lambda o: (carga_professor.get(int(self.opcao_professor[o]), 0), random.random())
+                )
+                prof = int(self.opcao_professor[opcao_escolhida[d]])
+                carga_professor[prof] = carga_professor.get(prof, 0) + self.aulas_turma[t].count(d)
+
+            for d in self.aulas_turma[t]:
+                opcao = opcao_escolhida[d]
+                prof = int(self.opcao_professor[opcao])
+                slot = next(
+                    (s for s in livres
+                     if not self.restricoes[d, s // self.aulas_por_dia, s % self.aulas_por_dia]
+                     and (prof < 0 or ((prof, s) not in ocupados and
+                                       self.disponibilidade[prof, s // self.aulas_por_dia, s % self.aulas_por_dia]))),
+                    livres[0]
+                )
+                livres.remove(slot)
+                individuo[t * self.num_slots + slot] = opcao
+                if prof >= 0:
+                    ocupados.add((prof, slot))
+
+        return individuo
+
+    def mutar(self, individuo, indpb: float = 0.05):
+        """
+        Mutação que preserva as aulas de cada turma
+
+        Troca a aula de slot dentro da própria turma ou substitui o professor por
+        outro habilitado para a mesma aula (lista pré-calculada).
+        """
+        for k in range(self.num_genes):
+            if random.random() >= indpb:
+                continue
+            opcao = individuo[k]
+            if opcao >= 0 and len(self.alternativas[opcao]) > 1 and random.random() < 0.5:
+                individuo[k] = random.choice(self.alternativas[opcao])
+            else:
+                j = self.gene_turma[k] * self.num_slots + random.randrange(self.num_slots)
+                individuo[k], individuo[j] = individuo[j], individuo[k]
+        return individuo
+
+    def cruzar_blocos(self, ind1, ind2, indpb: float = 0.5):
+        """Cruzamento uniforme por blocos de slots de turma, preservando as aulas de cada turma"""
+        for t in range(self.num_turmas):
+            if random.random() < indpb:
+                inicio, fim = t * self.num_slots, (t + 1) * self.num_slots
+                ind1[inicio:fim], ind2[inicio:fim] = ind2[inicio:fim], ind1[inicio:fim]
+        return ind1, ind2
+
+    def reparar(self, individuo):
+        """
+        Remove choques de professor trocando o professor da aula por um habilitado
+        livre no slot ou movendo a aula para outro slot livre da mesma turma
+        """
+        genes = np.asarray(individuo, dtype=np.int64)
+        profs = self.professores_genes(genes)
+        validos = profs >= 0
+        ocupacao = np.zeros((len(self.professores), self.num_slots), dtype=np.int32)
+        np.add.at(ocupacao, (profs[validos], self.gene_slot[validos]), 1)
+
+        conflitantes = np.flatnonzero(validos)
+        conflitantes = conflitantes[ocupacao[profs[conflitantes], self.gene_slot[conflitantes]] > 1]
+        if len(conflitantes) == 0:
+            return individuo
+
+        slots = np.arange(self.num_slots)
+        dias_slots = slots // self.aulas_por_dia
+        horas_slots = slots % self.aulas_por_dia
+
+        for k in np.random.permutation(conflitantes):
+            p, s = profs[k], self.gene_slot[k]
+            if ocupacao[p, s] <= 1:
+                continue
+            d, h = s // self.aulas_por_dia, s % self.aulas_por_dia
+
+            # 1. Outro professor habilitado livre e disponível neste slot
+            alternativa = next(
+                (o for o in self.alternativas[genes[k]]
+                 if self.opcao_professor[o] >= 0 and ocupacao[self.opcao_professor[o], s] == 0
+                 and self.disponibilidade[self.opcao_professor[o], d, h]),
+                None
+            )
+            if alternativa is not None:
+                q = self.opcao_professor[alternativa]
+                ocupacao[p, s] -= 1
+                ocupacao[q, s] += 1
+                genes[k], profs[k] = alternativa, q
+                individuo[k] = int(alternativa)
+                continue
+
+            # 2. Trocar de slot com outra posição da turma sem criar novos choques
+            inicio = self.gene_turma[k] * self.num_slots
+            outros = profs[inicio:inicio + self.num_slots]
+            livres = (
+                (ocupacao[p, slots] == 0) &
+                ((outros < 0) | (ocupacao[np.maximum(outros, 0), s] == 0)) &
+                (outros != p)
+            )
+            if not livres.any():
+                continue
+            opcoes_turma = genes[inicio:inicio + self.num_slots]
+            disc = self.opcao_disciplina[genes[k]]
+            disc_outros = self.opcao_disciplina[np.maximum(opcoes_turma, 0)]
+            vago = opcoes_turma < 0
+            preferencia = np.where(
+                livres,
+                self.disponibilidade[p, dias_slots, horas_slots].astype(np.int32) +
+                ~self.restricoes[disc, dias_slots, horas_slots] +
+                ((outros < 0) | self.disponibilidade[np.maximum(outros, 0), d, h]) +
+                (vago | ~self.restricoes[disc_outros, d, h]) +
+                np.random.random(self.num_slots) * 0.1,
+                -1.0
+            )
+            s2 = int(np.argmax(preferencia))
+            k2 = inicio + s2
+            p2 = outros[s2]
+
+            ocupacao[p, s] -= 1
+            ocupacao[p, s2] += 1
+            if p2 >= 0:
+                ocupacao[p2, s2] -= 1
+                ocupacao[p2, s] += 1
+            genes[k], genes[k2] = genes[k2], genes[k]
+            profs[k], profs[k2] = p2, p
+            individuo[k], individuo[k2] = individuo[k2], individuo[k]
+
+        return individuo
+
+    def busca_local(self, individuo, max_iteracoes: int, tempo_limite: float,
+                    peso_disponibilidade: float, peso_restricoes: float,
+                    penalidade_conflito: float, proxy=None, peso_ml: float = 0.0) -> float:
+        """
+        Subida de encosta limitada com avaliação incremental (delta) do score de restrições
+
+        Movimentos: troca de slot entre duas aulas da mesma turma ou troca do professor
+        por outro habilitado. Apenas movimentos que melhoram o score são aceitos.
+
+        :param max_iteracoes: Número máximo de movimentos avaliados
+        :param tempo_limite: Tempo máximo em segundos
+        :param proxy: ProxyLinear opcional; soma peso_ml × variação do score ML aproximado,
+                      calculada só sobre a turma alterada
+        :return: Ganho total no score de restrições (mais o termo do proxy, se usado)
+        """
+        inicio_busca = time.time()
+        genes = np.asarray(individuo, dtype=np.int64)
+        alocados = genes >= 0
+        total_aulas = int(alocados.sum())
+        if total_aulas == 0:
+            return 0.0
+
+        profs = self.professores_genes(genes)
+        ocupacao = np.zeros((len(self.professores), self.num_slots), dtype=np.int32)
+        validos = profs >= 0
+        np.add.at(ocupacao, (profs[validos], self.gene_slot[validos]), 1)
+
+        w_disp = peso_disponibilidade * 100.0 / total_aulas
+        w_restr = peso_restricoes * 100.0 / total_aulas
+        usar_proxy = proxy is not None and peso_ml != 0
+        slots = np.arange(self.num_slots)
+        dias_slots = slots // self.aulas_por_dia
+        horas_slots = slots % self.aulas_por_dia
+        ganho_total = 0.0
+
+        for _ in range(max_iteracoes):
+            if time.time() - inicio_busca > tempo_limite:
+                break
+
+            # Priorizar aulas com choque, indisponibilidade ou restrição violada
+            disponivel = self.avaliar_disponibilidade(genes) | (profs < 0)
+            permitido = self.avaliar_restricoes(genes)
+            em_choque = validos & (ocupacao[np.maximum(profs, 0), self.gene_slot] > 1)
+            problemas = np.flatnonzero(alocados & (em_choque | ~disponivel | ~permitido))
+            candidatos = problemas if len(problemas) else np.flatnonzero(alocados)
+            k = int(np.random.choice(candidatos))
+
+            p, s = profs[k], self.gene_slot[k]
+            d, h = s // self.aulas_por_dia, s % self.aulas_por_dia
+            disc = self.opcao_disciplina[genes[k]]
+            inicio = self.gene_turma[k] * self.num_slots
+            opcoes_turma = genes[inicio:inicio + self.num_slots]
+            outros = profs[inicio:inicio + self.num_slots]
+            vago = opcoes_turma < 0
+            disc_outros = self.opcao_disciplina[np.maximum(opcoes_turma, 0)]
+            q = np.maximum(outros, 0)
+
+            # Delta das trocas de slot com cada posição da turma
+            disp_p = self.disponibilidade[p, d, h] if p >= 0 else True
+            delta_disp = (
+                (self.disponibilidade[p, dias_slots, horas_slots] if p >= 0 else np.ones(self.num_slots, bool)).astype(np.int32)
+                + ((outros < 0) | self.disponibilidade[q, d, h])
+                - int(disp_p)
+                - ((outros < 0) | self.disponibilidade[q, dias_slots, horas_slots])
+            )
+            delta_restr = (
+                (~self.restricoes[disc, dias_slots, horas_slots]).astype(np.int32)
+                + (vago | ~self.restricoes[disc_outros, d, h])
+                - int(not self.restricoes[disc, d, h])
+                - (vago | ~self.restricoes[disc_outros, dias_slots, horas_slots])
+            )
+            delta_conf = np.zeros(self.num_slots, dtype=np.int32)
+            if p >= 0:
+                delta_conf += (ocupacao[p, slots] >= 1).astype(np.int32) - int(ocupacao[p, s] > 1)
+            delta_conf += np.where(outros >= 0, (ocupacao[q, s] >= 1).astype(np.int32) - (ocupacao[q, slots] > 1), 0)
+            delta_swap = w_disp * delta_disp + w_restr * delta_restr - penalidade_conflito * delta_conf
+
+            # Variação do score ML aproximado: um único lote com todas as trocas e alternativas
+            alternativas = self.alternativas[genes[k]]
+            if usar_proxy:
+                delta_proxy = peso_ml * self._delta_proxy(proxy, opcoes_turma, s, alternativas)
+                delta_swap = delta_swap + delta_proxy[:self.num_slots]
+                delta_proxy_alt = delta_proxy[self.num_slots:]
+
+            delta_swap[(outros == p) & (p >= 0)] = -np.inf
+            delta_swap[s] = -np.inf
+
+            # Delta das trocas de professor
+            melhor_alt, delta_alt = None, 0.0
+            for i, o in enumerate(alternativas):
+                r = self.opcao_professor[o]
+                if o == genes[k] or r < 0 or p < 0:
+                    continue
+                delta = (w_disp * (int(self.disponibilidade[r, d, h]) - int(disp_p)) -
+                         penalidade_conflito * (-int(ocupacao[p, s] > 1) + int(ocupacao[r, s] >= 1)))
+                if usar_proxy:
+                    delta += delta_proxy_alt[i]
+                if melhor_alt is None or delta > delta_alt:
+                    melhor_alt, delta_alt = o, delta
+
+            s2 = int(np.argmax(delta_swap))
+            if melhor_alt is not None and delta_alt > max(delta_swap[s2], 1e-9):
+                r = self.opcao_professor[melhor_alt]
+                ocupacao[p, s] -= 1
+                ocupacao[r, s] += 1
+                genes[k], profs[k] = melhor_alt, r
+                individuo[k] = int(melhor_alt)
+                ganho_total += delta_alt
+            elif delta_swap[s2] > 1e-9:
+                k2 = inicio + s2
+                p2 = profs[k2]
+                if p >= 0:
+                    ocupacao[p, s] -= 1
+                    ocupacao[p, s2] += 1
+                if p2 >= 0:
+                    ocupacao[p2, s2] -= 1
+                    ocupacao[p2, s] += 1
+                genes[k], genes[k2] = genes[k2], genes[k]
+                profs[k], profs[k2] = p2, p
+                alocados[k], alocados[k2] = alocados[k2], alocados[k]
+                validos[k], validos[k2] = validos[k2], validos[k]
+                individuo[k], individuo[k2] = individuo[k2], individuo[k]
+                ganho_total += delta_swap[s2]
+
+        return ganho_total
+
+    def _delta_proxy(self, proxy, genes_turma, s: int, alternativas) -> np.ndarray:
+        """
+        Variação da contribuição da turma no proxy para cada movimento sobre o slot s
+
+        Retorna [num_slots + len(alternativas)]: trocas de s com cada slot da turma, seguidas
+        das trocas de opção (professor) em s.
+        """
+        trocas = np.tile(genes_turma, (self.num_slots, 1))
+        slots = np.arange(self.num_slots)
+        trocas[slots, s] = genes_turma
+        trocas[slots, slots] = genes_turma[s]
+
+        opcoes = np.tile(genes_turma, (len(alternativas), 1))
+        opcoes[:, s] = alternativas
+
+        candidatos = np.vstack([genes_turma[None], trocas, opcoes])
+        contribuicoes = proxy.pontuar_turmas(*self.para_grade(candidatos, num_turmas=1))[:, 0]
+        return contribuicoes[1:] - contribuicoes[0]
+
+    def para_grade(self, individuo, num_turmas: int = None):
+        """
+        Converte o cromossomo nas grades [turmas, 5, 7] de professores e disciplinas (-1 = vazio)
+
+        Formato aceito por FeatureProcessor.extract_features_grade; aceita também um lote [lote, genes].
+
+        :param num_turmas: Turmas cobertas pelos genes (padrão: todas do turno; 1 para os genes de
+                           uma única turma)
+        """
+        genes = np.asarray(individuo, dtype=np.int64)
+        num_turmas = self.num_turmas if num_turmas is None else num_turmas
+        forma = genes.shape[:-1] + (num_turmas, len(self.dias), self.aulas_por_dia)
+        alocados = genes >= 0
+        professores = np.where(alocados, self.opcao_professor[np.where(alocados, genes, 0)], -1)
+        disciplinas = np.where(alocados, self.opcao_disciplina[np.where(alocados, genes, 0)], -1)
+        return professores.reshape(forma), disciplinas.reshape(forma)
+
+    def analisar_conflitos(self, individuo) -> Dict[str, Any]:
+        """Contagens e células de conflito do turno (sobreposição, janelas, restrições, carga diária)"""
+        return self.analisador.analisar(*self.para_grade(individuo))
+
+    def professores_genes(self, individuo) -> np.ndarray:
+        """Retorna o índice do professor de cada gene (-1 para slot vago ou sem professor)"""
+        genes = np.asarray(individuo, dtype=np.int64)
+        profs = np.full(genes.shape, -1, dtype=np.int64)
+        alocados = genes >= 0
+        profs[alocados] = self.opcao_professor[genes[alocados]]
+        return profs
+
+    def contar_conflitos(self, individuo) -> int:
+        """Conta choques de professor entre turmas via bincount sobre (professor, slot)"""
+        profs = self.professores_genes(individuo)
+        validos = profs >= 0
+        chaves = profs[validos] * self.num_slots + self.gene_slot[validos]
+        contagem = np.bincount(chaves, minlength=len(self.professores) * self.num_slots)
+        return int(np.maximum(contagem - 1, 0).sum())
+
+    def desvio_carga(self, individuo) -> int:
+        """Soma das diferenças entre as aulas presentes e a carga exigida de cada disciplina"""
+        genes = np.asarray(individuo, dtype=np.int64)
+        genes = genes[genes >= 0]
+        chaves = self.opcao_turma[genes].astype(np.int64) * len(self.disciplinas) + self.opcao_disciplina[genes]
+        contagem = np.bincount(chaves, minlength=len(self.carga_exigida))
+        return int(np.abs(contagem - self.carga_exigida).sum())
+
+    def avaliar_disponibilidade(self, individuo) -> np.ndarray:
+        """Retorna máscara por gene indicando se o professor está disponível no slot"""
+        profs = self.professores_genes(individuo)
+        ok = np.zeros(self.num_genes, dtype=bool)
+        validos = profs >= 0
+        ok[validos] = self.disponibilidade[
+            profs[validos], self.gene_dia[validos], self.gene_hora[validos]
+        ]
+        return ok
+
+    def avaliar_restricoes(self, individuo) -> np.ndarray:
+        """Retorna máscara por gene indicando se a disciplina é permitida no slot"""
+        genes = np.asarray(individuo, dtype=np.int64)
+        ok = np.zeros(self.num_genes, dtype=bool)
+        alocados = genes >= 0
+        ok[alocados] = ~self.restricoes[
+            self.opcao_disciplina[genes[alocados]], self.gene_dia[alocados], self.gene_hora[alocados]
+        ]
+        return ok
+
+    def decodificar(self, individuo) -> Dict[str, Any]:
+        """Converte o cromossomo no formato de horário usado pelo restante do sistema"""
+        horario = {
+            turma: {'dias': {dia: {} for dia in self.dias}}
+            for turma in self.turmas
+        }
+
+        for k, opcao in enumerate(individuo):
+            if opcao < 0:
+                continue
+            prof = self.opcao_professor[opcao]
+            turma = self.turmas[self.gene_turma[k]]
+            dia = self.dias[self.gene_dia[k]]
+            horario[turma]['dias'][dia][int(self.gene_hora[k]) + 1] = {
+                'professor': self.professores[prof] if prof >= 0 else None,
+                'disciplina': self.disciplinas[self.opcao_disciplina[opcao]]
+            }
+
+        return horario
@@ -0,0 +1,150 @@
+import logging
+from collections import deque
+from typing import Dict, Any, Sequence
+
+import numpy as np
+
+
+class MonitorConvergencia:
+    CONTINUAR = 'continuar'
+    REINICIAR = 'reiniciar'
+    PARAR = 'parar'
+
+    def __init__(self,
+                 p_crossover: float,
+                 p_mutacao: float,
+                 janela: int = 10,
+                 tolerancia: float = 0.01,
+                 fator_adaptacao: float = 1.5,
+                 p_crossover_max: float = 0.95,
+                 p_mutacao_max: float = 0.6,
+                 max_adaptacoes: int = 3,
+                 politica: str = 'reiniciar',
+                 max_reinicios: int = 2):
+        """
+        Detecta estagnação do algoritmo genético e adapta as taxas dos operadores
+
+        A janela não é zerada ao adaptar: cada geração com a janela estagnada soma ao contador
+        de gerações estagnadas, que só volta a zero quando o melhor fitness progride. As
+        adaptações são espaçadas em janela // (max_adaptacoes + 1) gerações; se a última também
+        não trouxer melhoria, a política é aplicada.
+
+        :param janela: Número de gerações usadas para comparar melhor e média do fitness
+        :param tolerancia: Melhoria mínima na janela para não considerar estagnação
+        :param fator_adaptacao: Fator de aumento das taxas a cada estagnação
+        :param max_adaptacoes: Adaptações das taxas antes de aplicar a política
+        :param politica: 'reiniciar' (renova a população mantendo a elite) ou 'parar'
+        :param max_reinicios: Reinícios permitidos antes de encerrar a execução
+        """
+        self.logger = logging.getLogger(__name__)
+        self.p_crossover_base = p_crossover
+        self.p_mutacao_base = p_mutacao
+        self.p_crossover = p_crossover
+        self.p_mutacao = p_mutacao
+        self.janela = janela
+        self.tolerancia = tolerancia
+        self.fator_adaptacao = fator_adaptacao
+        self.p_crossover_max = p_crossover_max
+        self.p_mutacao_max = p_mutacao_max
+        self.max_adaptacoes = max_adaptacoes
+        self.politica = politica
+        self.max_reinicios = max_reinicios
+
+        self.historico_melhor = deque(maxlen=janela + 1)
+        self.historico_media = deque(maxlen=janela + 1)
+        self.intervalo_adaptacao = max(1, janela // (max_adaptacoes + 1))
+        self.adaptacoes_seguidas = 0
+        self.geracoes_estagnadas = 0
+        self.reinicios = 0
+
+    def estagnado(self) -> bool:
+        """Verifica se melhor e média do fitness pararam de melhorar na janela"""
+        if len(self.historico_melhor) <= self.janela:
+            return False
+        ganho_melhor = self.historico_melhor[-1] - self.historico_melhor[0]
+        ganho_media = self.historico_media[-1] - self.historico_media[0]
+        return ganho_melhor <= self.tolerancia and ganho_media <= self.tolerancia
+
+    def registrar(self, fitnesses: Sequence[float]) -> str:
+        """
+        Registra o fitness da população de uma geração e decide o próximo passo
+
+        :return: 'continuar', 'reiniciar' ou 'parar'
+        """
+        self.historico_melhor.append(float(np.max(fitnesses)))
+        self.historico_media.append(float(np.mean(fitnesses)))
+
+        if len(self.historico_melhor) <= self.janela:
+            # Janela ainda incompleta: manter as taxas atuais
+            return self.CONTINUAR
+
+        if self.historico_melhor[-1] - self.historico_melhor[0] > self.tolerancia:
+            # Voltar gradualmente às taxas base enquanto o melhor progredir
+            self.adaptacoes_seguidas = 0
+            self.geracoes_estagnadas = 0
+            self.p_crossover = max(self.p_crossover_base, self.p_crossover / self.fator_adaptacao)
+            self.p_mutacao = max(self.p_mutacao_base, self.p_mutacao / self.fator_adaptacao)
+            return self.CONTINUAR
+
+        if not self.estagnado():
+            # Só a média melhorou (ex.: população se recuperando de um reinício): não conta
+            # como geração estagnada, mas também não zera a contagem
+            return self.CONTINUAR
+
+        self.geracoes_estagnadas += 1
+        if self.adaptacoes_seguidas < self.max_adaptacoes:
+            if (self.geracoes_estagnadas - 1) % self.intervalo_adaptacao == 0:
+                self.adaptacoes_seguidas += 1
+                self.p_crossover = min(self.p_crossover_max, self.p_crossover * self.fator_adaptacao)
+                self.p_mutacao = min(self.p_mutacao_max, self.p_mutacao * self.fator_adaptacao)
+                self.logger.info(
+                    f"Estagnação detectada: cxpb={self.p_crossover:.2f}, mutpb={self.p_mutacao:.2f}"
+                )
+            return self.CONTINUAR
+
+        # A última adaptação também tem intervalo_adaptacao gerações para surtir efeito
+        if self.geracoes_estagnadas <= self.max_adaptacoes * self.intervalo_adaptacao:
+            return self.CONTINUAR
+
+        if self.politica == self.REINICIAR and self.reinicios < self.max_reinicios:
+            self.reinicios += 1
+            self.adaptacoes_seguidas = 0
+            self.geracoes_estagnadas = 0
+            self.p_crossover = self.p_crossover_base
+            self.p_mutacao = self.p_mutacao_base
+            return self.REINICIAR
+
+        return self.PARAR
+
+    def obter_estado(self) -> Dict[str, Any]:
+        """Retorna o estado atual das taxas e da política"""
+        return {
+            'p_crossover': self.p_crossover,
+            'p_mutacao': self.p_mutacao,
+            'adaptacoes_seguidas': self.adaptacoes_seguidas,
+            'geracoes_estagnadas': self.geracoes_estagnadas,
+            'reinicios': self.reinicios,
+            'historico_melhor': list(self.historico_melhor),
+            'historico_media': list(self.historico_media)
+        }
+
+    def restaurar_estado(self, estado: Dict[str, Any]):
+        """Restaura taxas, contadores e janela a partir de obter_estado (ex.: checkpoint)"""
+        self.p_crossover = estado['p_crossover']
+        self.p_mutacao = estado['p_mutacao']
+        self.adaptacoes_seguidas = estado['adaptacoes_seguidas']
+        self.geracoes_estagnadas = estado.get('geracoes_estagnadas', 0)
+        self.reinicios = estado['reinicios']
+        self.historico_melhor.clear()
+        self.historico_melhor.extend(estado.get('historico_melhor', []))
+        self.historico_media.clear()
+        self.historico_media.extend(estado.get('historico_media', []))
+
+
+def calcular_diversidade(populacao) -> float:
+    """Fração média de genes que diferem do melhor indivíduo (0 = população convergida)"""
+    matriz = np.asarray([list(ind) for ind in populacao])
+    if len(matriz) < 2:
+        return 0.0
+    melhor = matriz[int(np.argmax([ind.fitness.values[0] for ind in populacao]))]
+    return float(np.mean(matriz != melhor))
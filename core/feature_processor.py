@@ -1,170 +1,268 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 from scheduler.config import FEATURE_ENGINEERING
 
+# Versão do esquema de features; incrementar sempre que nomes ou ordem mudarem
+FEATURE_SCHEMA_VERSION = 3
+
+DIAS_SEMANA = ['seg', 'ter', 'qua', 'qui', 'sex']
+AULAS_POR_DIA = 7
+
+FEATURES_GLOBAIS = [
+    'total_aulas', 'total_janelas', 'professores_unicos', 'disciplinas_unicas',
+    'std_carga_professores', 'std_distribuicao_disciplinas'
+]
+
+FEATURES_DIA = [
+    'total_aulas', 'janelas', 'primeira_aula', 'ultima_aula',
+    'professores_distintos', 'max_aulas_professor', 'media_aulas_professor',
+    'max_seguidas', 'disciplinas_unicas'
+]
+
+# Estatísticas agregadas sobre as turmas (mantêm o vetor com tamanho fixo)
+ESTATISTICAS_TURMA = ['media', 'std', 'min', 'max']
+
+
 class FeatureProcessor:
     def __init__(self):
         self.feature_config = FEATURE_ENGINEERING
-        self.cached_features = {}
+        
+        # Blocos de features por turma (LRU) indexados pelo digest da grade da turma
+        self.cached_features = OrderedDict()
+        self.max_cached_features = 20000
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Esquema declarado: nomes e tamanho estáveis independente do número de turmas
+        self.nomes_turma = [f'{dia}_{nome}' for dia in DIAS_SEMANA for nome in FEATURES_DIA]
+        self.nomes_features = (
+            [f'global_{nome}' for nome in FEATURES_GLOBAIS] +
+            ['num_turmas'] +
+            [f'{estatistica}_{nome}' for estatistica in ESTATISTICAS_TURMA
+             for nome in self.nomes_turma]
+        )
+        self.num_features = len(self.nomes_features)
+        
+    def obter_schema(self) -> Dict[str, Any]:
+        """Retorna versão, tamanho e nomes das features do vetor de um horário completo"""
+        return {
+            'versao': FEATURE_SCHEMA_VERSION,
+            'tamanho': self.num_features,
+            'nomes': list(self.nomes_features)
+        }
         
     def extract_features(self, horario: Dict[str, Any], turma: str = None) -> np.ndarray:
         """
         Extrai features de um horário completo ou de uma turma específica
+        
+        Para o horário completo o vetor segue o esquema (FEATURE_SCHEMA_VERSION): features
+        globais, número de turmas e média/desvio/mínimo/máximo das features por turma.
         """
-        features = []
+        turmas = [t for t in horario.keys()
+                  if t != '_alocacoes_incompletas' and t != '_sugestoes_melhoria']
+        professores, disciplinas = self.horario_para_grade(horario, turmas)
         
         if turma:
-            features.extend(self._extract_turma_features(horario, turma))
-        else:
-            # Extrair features globais
-            features.extend(self._extract_global_features(horario))
-            
-            # Features por turma
-            for turma in horario.keys():
-                if turma != '_alocacoes_incompletas' and turma != '_sugestoes_melhoria':
-                    features.extend(self._extract_turma_features(horario, turma))
+            por_turma = self._extract_turmas_cache(professores[None], disciplinas[None])[0]
+            return por_turma[turmas.index(turma)]
         
-        return np.array(features)
+        return self.extract_features_grade(professores, disciplinas)
     
-    def _extract_global_features(self, horario: Dict[str, Any]) -> List[float]:
-        """Extrai características globais do horário"""
-        features = []
-        
-        # Total de aulas alocadas
-        total_aulas = 0
-        # Total de janelas
-        total_janelas = 0
-        # Distribuição de professores
-        prof_count = {}
-        # Distribuição de disciplinas
-        disc_count = {}
-        
-        for turma, dados in horario.items():
-            if turma not in ['_alocacoes_incompletas', '_sugestoes_melhoria']:
-                for dia, aulas in dados['dias'].items():
-                    # Contar aulas e janelas
-                    aulas_dia = 0
-                    ultimo_horario = None
-                    
-                    for horario, aula in sorted(aulas.items()):
-                        if aula:
-                            total_aulas += 1
-                            aulas_dia += 1
-                            
-                            # Contagem de professores e disciplinas
-                            prof_count[aula['professor']] = prof_count.get(aula['professor'], 0) + 1
-                            disc_count[aula['disciplina']] = disc_count.get(aula['disciplina'], 0) + 1
-                            
-                            # Verificar janelas
-                            if ultimo_horario and int(horario) - int(ultimo_horario) > 1:
-                                total_janelas += 1
-                            
-                            ultimo_horario = horario
-        
-        # Features de distribuição global
-        features.extend([
-            total_aulas,
-            total_janelas,
-            len(prof_count),  # Número de professores únicos
-            len(disc_count),  # Número de disciplinas únicas
-            np.std(list(prof_count.values())),  # Desvio padrão da carga dos professores
-            np.std(list(disc_count.values()))   # Desvio padrão da distribuição de disciplinas
-        ])
-        
-        return features
-    
-    def _extract_turma_features(self, horario: Dict[str, Any], turma: str) -> List[float]:
-        """Extrai características específicas de uma turma"""
-        features = []
-        dados_turma = horario[turma]['dias']
-        
-        # Features temporais
-        for dia in ['seg', 'ter', 'qua', 'qui', 'sex']:
-            aulas_dia = dados_turma.get(dia, {})
-            
-            # Features do dia
-            features.extend(self._extract_daily_features(aulas_dia))
-            
-            # Features de professores no dia
-            features.extend(self._extract_teacher_features(aulas_dia))
-            
-            # Features de distribuição
-            features.extend(self._extract_distribution_features(aulas_dia))
+    def horario_para_grade(self, horario: Dict[str, Any], turmas: List[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Converte o horário em grades inteiras [turmas, 5, 7] de professores e disciplinas
+        
+        Os IDs são locais ao horário (só a igualdade importa para as features); -1 indica slot vazio.
+        """
+        if turmas is None:
+            turmas = [t for t in horario.keys()
+                      if t != '_alocacoes_incompletas' and t != '_sugestoes_melhoria']
+        
+        professores = np.full((len(turmas), len(DIAS_SEMANA), AULAS_POR_DIA), -1, dtype=np.int32)
+        disciplinas = np.full_like(professores, -1)
+        ids_professores = {}
+        ids_disciplinas = {}
+        
+        for t, turma in enumerate(turmas):
+            for dia, aulas in horario[turma]['dias'].items():
+                if dia not in DIAS_SEMANA:
+                    continue
+                d = DIAS_SEMANA.index(dia)
+                for hora, aula in aulas.items():
+                    h = int(hora) - 1
+                    if not aula or not 0 <= h < AULAS_POR_DIA:
+                        continue
+                    professores[t, d, h] = ids_professores.setdefault(aula['professor'], len(ids_professores))
+                    disciplinas[t, d, h] = ids_disciplinas.setdefault(aula['disciplina'], len(ids_disciplinas))
         
-        return features
+        return professores, disciplinas
     
-    def _extract_daily_features(self, aulas_dia: Dict[int, Dict]) -> List[float]:
-        """Extrai características de um dia específico"""
-        features = []
-        
-        # Total de aulas no dia
-        total_aulas = len([a for a in aulas_dia.values() if a])
-        
-        # Distribuição ao longo do dia
-        horarios = sorted([int(h) for h in aulas_dia.keys()])
-        if horarios:
-            primeiro_horario = min(horarios)
-            ultimo_horario = max(horarios)
-            janelas = sum(1 for h in range(primeiro_horario, ultimo_horario)
-                         if h not in aulas_dia or not aulas_dia[h])
+    def extract_features_grade(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """
+        Extrai o vetor do esquema a partir das grades [turmas, 5, 7] ou de lotes [lote, turmas, 5, 7]
+        
+        Slots com disciplina < 0 são considerados vazios. Retorna [num_features] ou [lote, num_features].
+        """
+        professores = np.asarray(professores)
+        disciplinas = np.asarray(disciplinas)
+        lote = professores.ndim == 4
+        if not lote:
+            professores, disciplinas = professores[None], disciplinas[None]
+        
+        num_lote, num_turmas = professores.shape[:2]
+        globais = self._extract_global_grade(professores, disciplinas)
+        
+        if num_turmas:
+            por_turma = self._extract_turmas_cache(professores, disciplinas)
+            agregados = [por_turma.mean(axis=1), por_turma.std(axis=1),
+                         por_turma.min(axis=1), por_turma.max(axis=1)]
         else:
-            janelas = 0
+            agregados = [np.zeros((num_lote, len(self.nomes_turma)))] * len(ESTATISTICAS_TURMA)
+        
+        features = np.concatenate(
+            [globais, np.full((num_lote, 1), float(num_turmas))] + agregados, axis=1
+        )
+        return features if lote else features[0]
+    
+    def extract_blocos_dia(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """
+        Features de cada turma em cada dia [..., turmas, 5, 9] (FEATURES_DIA) a partir das grades
+        
+        Aceita grades [turmas, 5, 7] ou lotes [lote, turmas, 5, 7]; não usa o cache de blocos.
+        """
+        professores = np.asarray(professores)
+        disciplinas = np.asarray(disciplinas)
+        forma = professores.shape[:-2]
+        por_turma = self._extract_turmas_grade(
+            professores.reshape((1, -1) + professores.shape[-2:]),
+            disciplinas.reshape((1, -1) + disciplinas.shape[-2:])
+        )
+        return por_turma.reshape(forma + (len(DIAS_SEMANA), len(FEATURES_DIA)))
+    
+    def _extract_global_grade(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """Características globais [lote, 6] a partir das grades"""
+        ocupado = disciplinas >= 0
+        num_lote = ocupado.shape[0]
+        
+        total_aulas = ocupado.sum(axis=(1, 2, 3))
         
-        features.extend([
-            total_aulas,
-            janelas,
-            primeiro_horario if horarios else 0,
-            ultimo_horario if horarios else 0
-        ])
+        # Janelas: blocos de aulas separados por horários vagos dentro do mesmo dia
+        anterior = np.zeros_like(ocupado)
+        anterior[..., 1:] = ocupado[..., :-1]
+        blocos = (ocupado & ~anterior).sum(axis=-1)
+        total_janelas = np.maximum(blocos - 1, 0).sum(axis=(1, 2))
         
-        return features
+        unicos_prof, std_prof = self._contagens_por_lote(professores + 1, ocupado)
+        unicos_disc, std_disc = self._contagens_por_lote(disciplinas, ocupado)
+        
+        return np.stack([total_aulas, total_janelas, unicos_prof, unicos_disc,
+                         std_prof, std_disc], axis=1).astype(float).reshape(num_lote, -1)
     
-    def _extract_teacher_features(self, aulas_dia: Dict[int, Dict]) -> List[float]:
-        """Extrai características relacionadas aos professores"""
-        features = []
-        
-        # Contagem de aulas por professor
-        prof_count = {}
-        for aula in aulas_dia.values():
-            if aula:
-                prof = aula['professor']
-                prof_count[prof] = prof_count.get(prof, 0) + 1
-        
-        # Features de distribuição de professores
-        features.extend([
-            len(prof_count),  # Número de professores diferentes
-            max(prof_count.values()) if prof_count else 0,  # Máximo de aulas por professor
-            np.mean(list(prof_count.values())) if prof_count else 0  # Média de aulas por professor
-        ])
-        
-        return features
+    @staticmethod
+    def _contagens_por_lote(ids: np.ndarray, ocupado: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Número de IDs distintos e desvio padrão das contagens por elemento do lote"""
+        num_lote = ids.shape[0]
+        ids = ids.reshape(num_lote, -1)
+        ocupado = ocupado.reshape(num_lote, -1)
+        k = int(ids[ocupado].max()) + 1 if ocupado.any() else 1
+        
+        deslocados = ids + np.arange(num_lote)[:, None] * k
+        contagens = np.bincount(deslocados[ocupado], minlength=num_lote * k).reshape(num_lote, k)
+        
+        presentes = contagens > 0
+        unicos = presentes.sum(axis=1)
+        divisor = np.maximum(unicos, 1)
+        media = contagens.sum(axis=1) / divisor
+        variancia = (((contagens - media[:, None]) ** 2) * presentes).sum(axis=1) / divisor
+        return unicos, np.sqrt(variancia)
     
-    def _extract_distribution_features(self, aulas_dia: Dict[int, Dict]) -> List[float]:
-        """Extrai características da distribuição de aulas"""
-        features = []
-        
-        # Aulas seguidas da mesma disciplina
-        max_seguidas = 0
-        curr_seguidas = 0
-        ultima_disc = None
-        
-        for horario in sorted(aulas_dia.keys()):
-            aula = aulas_dia[horario]
-            if aula:
-                if ultima_disc == aula['disciplina']:
-                    curr_seguidas += 1
-                    max_seguidas = max(max_seguidas, curr_seguidas)
+    def _extract_turmas_cache(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """
+        Features por turma [lote, turmas, 45] reaproveitando blocos já calculados
+        
+        Cada turma é identificada pelo digest da sua grade; apenas turmas inéditas são calculadas
+        (em uma única chamada vetorizada). O LRU é compartilhado entre threads, então só é lido e
+        alterado sob o lock; o cálculo dos blocos faltantes roda fora dele.
+        """
+        num_lote, num_turmas = professores.shape[:2]
+        grades = np.concatenate([
+            np.ascontiguousarray(professores, dtype=np.int32).reshape(num_lote * num_turmas, -1),
+            np.ascontiguousarray(disciplinas, dtype=np.int32).reshape(num_lote * num_turmas, -1)
+        ], axis=1)
+        
+        chaves = [hashlib.blake2b(grade.tobytes(), digest_size=16).digest() for grade in grades]
+        blocos = np.empty((len(chaves), len(self.nomes_turma)))
+        faltantes = []
+        with self._cache_lock:
+            for i, chave in enumerate(chaves):
+                bloco = self.cached_features.get(chave)
+                if bloco is None:
+                    faltantes.append(i)
                 else:
-                    curr_seguidas = 1
-                ultima_disc = aula['disciplina']
+                    self.cached_features.move_to_end(chave)
+                    blocos[i] = bloco
+            
+            self.cache_hits += len(chaves) - len(faltantes)
+            self.cache_misses += len(faltantes)
+        
+        if faltantes:
+            forma = (len(faltantes), 1, len(DIAS_SEMANA), AULAS_POR_DIA)
+            calculados = self._extract_turmas_grade(
+                professores.reshape(-1, len(DIAS_SEMANA), AULAS_POR_DIA)[faltantes].reshape(forma),
+                disciplinas.reshape(-1, len(DIAS_SEMANA), AULAS_POR_DIA)[faltantes].reshape(forma)
+            )[:, 0]
+            blocos[faltantes] = calculados
+            with self._cache_lock:
+                for i, bloco in zip(faltantes, calculados):
+                    self.cached_features[chaves[i]] = bloco
+                
+                while len(self.cached_features) > self.max_cached_features:
+                    self.cached_features.popitem(last=False)
+        
+        return blocos.reshape(num_lote, num_turmas, -1)
+    
+    def _extract_turmas_grade(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """Características por turma [lote, turmas, 45] (9 features para cada dia)"""
+        ocupado = disciplinas >= 0
+        total = ocupado.sum(axis=-1)
+        tem_aulas = total > 0
+        
+        # Primeira/última aula (1-based) e horários vagos entre elas
+        primeira = np.where(tem_aulas, ocupado.argmax(axis=-1) + 1, 0)
+        ultima = np.where(tem_aulas, AULAS_POR_DIA - ocupado[..., ::-1].argmax(axis=-1), 0)
+        janelas = np.where(tem_aulas, ultima - primeira + 1 - total, 0)
+        
+        # Professores no dia
+        contagem_prof = self._contagem_iguais(professores, ocupado)
+        distintos_prof = (ocupado / np.maximum(contagem_prof, 1)).sum(axis=-1)
+        max_prof = contagem_prof.max(axis=-1)
+        media_prof = np.divide(total, distintos_prof, out=np.zeros(total.shape), where=distintos_prof > 0)
+        
+        # Maior sequência de aulas seguidas da mesma disciplina
+        sequencia = np.zeros(total.shape, dtype=np.int32)
+        max_seguidas = np.zeros_like(sequencia)
+        for h in range(AULAS_POR_DIA):
+            if h:
+                continua = ocupado[..., h - 1] & (disciplinas[..., h] == disciplinas[..., h - 1])
+                sequencia = np.where(continua, sequencia + 1, 1)
             else:
-                curr_seguidas = 0
-                ultima_disc = None
+                sequencia = np.ones_like(sequencia)
+            sequencia = np.where(ocupado[..., h], sequencia, 0)
+            max_seguidas = np.maximum(max_seguidas, sequencia)
         
-        features.extend([
-            max_seguidas,
-            len(set(a['disciplina'] for a in aulas_dia.values() if a))  # Disciplinas únicas
-        ])
+        distintas_disc = (ocupado / np.maximum(self._contagem_iguais(disciplinas, ocupado), 1)).sum(axis=-1)
         
-        return features
\ No newline at end of file
+        por_dia = np.stack([total, janelas, primeira, ultima, np.rint(distintos_prof), max_prof,
+                            media_prof, max_seguidas, np.rint(distintas_disc)], axis=-1).astype(float)
+        return por_dia.reshape(por_dia.shape[0], por_dia.shape[1], -1)
+    
+    @staticmethod
+    def _contagem_iguais(ids: np.ndarray, ocupado: np.ndarray) -> np.ndarray:
+        """Para cada slot ocupado, quantos slots do mesmo dia têm o mesmo ID"""
+        iguais = (ids[..., :, None] == ids[..., None, :]) & ocupado[..., :, None] & ocupado[..., None, :]
+        return iguais.sum(axis=-1)
@@ -0,0 +1,92 @@
+import joblib
+import numpy as np
+
+
+class FlorestaCompilada:
+    def __init__(self, feature: np.ndarray, limiar: np.ndarray, esquerda: np.ndarray,
+                 direita: np.ndarray, valor: np.ndarray, raizes: np.ndarray,
+                 profundidade: int, versao: int = 0):
+        """
+        Floresta de regressão achatada em vetores contíguos para predição vetorizada
+
+        Os nós de todas as árvores ficam nos mesmos vetores; esquerda/direita guardam índices
+        globais (-1 em folhas) e raizes o índice do primeiro nó de cada árvore.
+        """
+        self.feature = feature
+        self.limiar = limiar
+        self.esquerda = esquerda
+        self.direita = direita
+        self.valor = valor
+        self.raizes = raizes
+        self.profundidade = int(profundidade)
+        self.versao = int(versao)
+
+    @classmethod
+    def compilar(cls, modelo) -> 'FlorestaCompilada':
+        """Exporta um RandomForestRegressor (sklearn) treinado"""
+        features, limiares, esquerdas, direitas, valores, raizes = [], [], [], [], [], []
+        deslocamento = 0
+        profundidade = 0
+
+        for estimador in modelo.estimators_:
+            arvore = estimador.tree_
+            folha = arvore.children_left < 0
+            raizes.append(deslocamento)
+            features.append(np.where(folha, 0, arvore.feature))
+            limiares.append(arvore.threshold)
+            esquerdas.append(np.where(folha, -1, arvore.children_left + deslocamento))
+            direitas.append(np.where(folha, -1, arvore.children_right + deslocamento))
+            valores.append(arvore.value[:, 0, 0])
+            profundidade = max(profundidade, arvore.max_depth)
+            deslocamento += arvore.node_count
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            limiar=np.concatenate(limiares).astype(np.float64),
+            esquerda=np.concatenate(esquerdas).astype(np.int32),
+            direita=np.concatenate(direitas).astype(np.int32),
+            valor=np.concatenate(valores).astype(np.float64),
+            raizes=np.asarray(raizes, dtype=np.int32),
+            profundidade=profundidade,
+            versao=getattr(modelo, 'versao_', 0)
+        )
+
+    def predizer(self, X: np.ndarray) -> np.ndarray:
+        """Prevê uma linha [features] ou um lote [n, features]; média das folhas de todas as árvores"""
+        X = np.asarray(X)
+        uma_linha = X.ndim == 1
+        # Mesma comparação do sklearn: features em float32 contra limiares em float64
+        X = np.atleast_2d(X).astype(np.float32)
+
+        linhas = np.arange(X.shape[0])[:, None]
+        nos = np.broadcast_to(self.raizes, (X.shape[0], len(self.raizes))).copy()
+
+        for _ in range(self.profundidade):
+            esquerda = self.esquerda[nos]
+            folha = esquerda < 0
+            if folha.all():
+                break
+            vai_esquerda = X[linhas, self.feature[nos]] <= self.limiar[nos]
+            nos = np.where(folha, nos, np.where(vai_esquerda, esquerda, self.direita[nos]))
+
+        scores = self.valor[nos].mean(axis=1)
+        return scores[0] if uma_linha else scores
+
+    def verificar_paridade(self, modelo, X: np.ndarray, tolerancia: float = 1e-9) -> bool:
+        """Compara as predições com as do modelo sklearn de origem"""
+        esperado = modelo.predict(np.atleast_2d(X))
+        obtido = self.predizer(np.atleast_2d(X))
+        return bool(np.allclose(esperado, obtido, rtol=0, atol=tolerancia))
+
+    def salvar(self, caminho: str):
+        """Grava os vetores sem compressão (permite mapeamento em memória na carga)"""
+        joblib.dump({
+            'feature': self.feature, 'limiar': self.limiar, 'esquerda': self.esquerda,
+            'direita': self.direita, 'valor': self.valor, 'raizes': self.raizes,
+            'profundidade': self.profundidade, 'versao': self.versao
+        }, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str) -> 'FlorestaCompilada':
+        """Carrega uma floresta exportada por salvar, com os vetores mapeados em memória"""
+        return cls(**joblib.load(caminho, mmap_mode='r'))
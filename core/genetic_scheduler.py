@@ -2,9 +2,8 @@ import sys
 import os
 import logging
 import time
-from typing import List, Dict, Any, Optional
-import traceback
 import random
+from collections import deque, OrderedDict
 import numpy as np
 import pandas as pd
 from deap import base, creator, tools, algorithms
@@ -25,384 +24,23 @@ try:
     import numpy as np
     import pandas as pd
     import random
-    import json
-    import pickle
-    from typing import List, Dict, Any
     import time
-    from sklearn.preprocessing import StandardScaler
-    from sklearn.model_selection import train_test_split
-    from sklearn.ensemble import RandomForestRegressor
-    from sklearn.metrics import mean_squared_error, r2_score
 except ImportError as e:
     print(f"Erro ao importar bibliotecas: {e}")
     sys.exit(1)
 
-class ModeloAlocacaoHorarios:
-    def __init__(self, 
-                 taxa_aprendizado=0.01, 
-                 fator_desconto=0.95, 
-                 exploracao_inicial=1.0,
-                 num_features=10,
-                 max_tentativas=5):
-        """
-        Modelo de Machine Learning para otimização de horários com melhorias
-        
-        :param max_tentativas: Número máximo de tentativas para operações críticas
-        """
-        self.max_tentativas = max_tentativas
-        
-        # Métricas de desempenho expandidas
-        self.metricas = {
-            'tempo_execucao': [],
-            'mse': [],
-            'r2': [],
-            'num_alocacoes': 0,
-            'tentativas_fallback': 0,
-            'erros_capturados': []
-        }
-        
-        # Modelo de regressão para predição de qualidade de alocação
-        self.modelo_regressao = RandomForestRegressor(
-            n_estimators=100, 
-            max_depth=10, 
-            random_state=42
-        )
-        
-        # Escalador para normalização de features
-        self.scaler = StandardScaler()
-        
-        # Armazenamento de dados históricos
-        self.historico_alocacoes = []
-        self.historico_recompensas = []
-        
-        # Caminho para persistência de modelo
-        self.caminho_modelo = os.path.join(base_path, 'modelo_alocacao_ml.pkl')
-        
-        # Métricas de desempenho
-        self.metricas = {
-            'mse': [],
-            'r2': [],
-            'num_alocacoes': 0
-        }
-    
-    def _extrair_features(self, aula, turma, dia, horario):
-        """
-        Extrai características relevantes para representação de uma aula
-        
-        :return: Vetor de características
-        """
-        features = [
-            # Características da disciplina
-            len(aula['disciplina']),  # Complexidade do nome
-            self._mapear_dia(dia),    # Codificação do dia
-            horario,                  # Horário específico
-            
-            # Características do professor
-            len(aula['professor']),   # Complexidade do nome
-            
-            # Características da turma
-            len(turma),                # Complexidade do nome da turma
-            
-            # Características temporais
-            self._calcular_distribuicao_aulas(turma, dia),
-            self._calcular_carga_horaria_dia(turma, dia),
-            
-            # Características de aleatoriedade
-            random.random(),           # Componente aleatória
-            random.random(),           # Componente aleatória adicional
-            random.random()            # Componente aleatória final
-        ]
-        
-        return np.array(features)
-    
-    def _mapear_dia(self, dia):
-        """
-        Mapeia dias da semana para valores numéricos
-        """
-        dias_mapa = {'seg': 1, 'ter': 2, 'qua': 3, 'qui': 4, 'sex': 5}
-        return dias_mapa.get(dia, 0)
-    
-    def _calcular_distribuicao_aulas(self, turma, dia):
-        """
-        Calcula a distribuição de aulas em um dia específico
-        """
-        # Implementação simplificada
-        return random.random()
-    
-    def _calcular_carga_horaria_dia(self, turma, dia):
-        """
-        Calcula carga horária total de um dia
-        """
-        # Implementação simplificada
-        return random.random()
-    
-    def _executar_com_fallback(self, funcao, *args, **kwargs):
-        """
-        Executa função com múltiplas tentativas e fallback
-        
-        :param funcao: Função a ser executada
-        :return: Resultado da função ou valor padrão
-        """
-        for tentativa in range(self.max_tentativas):
-            try:
-                return funcao(*args, **kwargs)
-            except Exception as e:
-                logger.warning(f'Tentativa {tentativa+1} falhou: {e}')
-                self.metricas['tentativas_fallback'] += 1
-                self.metricas['erros_capturados'].append(str(e))
-                
-                # Estratégia de fallback com aleatoriedade
-                if tentativa == self.max_tentativas - 1:
-                    logger.error(f'Falha definitiva em {funcao.__name__}')
-                    return self._fallback_padrao(*args, **kwargs)
-                
-                # Exponential backoff
-                time.sleep(2 ** tentativa)
-        
-    def _fallback_padrao(self, *args, **kwargs):
-        """
-        Método de fallback genérico
-        """
-        logger.warning('Usando estratégia de fallback padrão')
-        return random.choice(list(args)) if args else None
-    
-    def treinar(self, horarios_historico):
-        """
-        Treinar modelo com logging e métricas detalhadas
-        """
-        inicio = time.time()
-        
-        try:
-            X_treino = []
-            y_treino = []
-            
-            for horario in horarios_historico:
-                for turma, grade in horario.items():
-                    for dia, aulas in grade['dias'].items():
-                        for horario_aula, aula in aulas.items():
-                            if aula:
-                                features = self._extrair_features(aula, turma, dia, horario_aula)
-                                recompensa = self._calcular_recompensa(aula, turma, dia, horario_aula)
-                                
-                                X_treino.append(features)
-                                y_treino.append(recompensa)
-            
-            # Preparar dados de treino
-            if not X_treino or not y_treino:
-                logger.warning('Nenhum dado de treinamento disponível')
-                return
-            
-            X_treino = self.scaler.fit_transform(X_treino)
-            
-            # Dividir dados em treino e validação
-            X_train, X_val, y_train, y_val = train_test_split(
-                X_treino, y_treino, test_size=0.2, random_state=42
-            )
-            
-            # Treinar modelo de regressão
-            self.modelo_regressao.fit(X_train, y_train)
-            
-            # Avaliar modelo
-            y_pred = self.modelo_regressao.predict(X_val)
-            mse = mean_squared_error(y_val, y_pred)
-            r2 = r2_score(y_val, y_pred)
-            
-            # Armazenar métricas
-            self.metricas['mse'].append(mse)
-            self.metricas['r2'].append(r2)
-            
-            # Métricas de desempenho
-            tempo_total = time.time() - inicio
-            self.metricas['tempo_execucao'].append(tempo_total)
-            
-            logger.info(f'Treinamento concluído em {tempo_total:.2f} segundos')
-            logger.info(f'Métricas: MSE={mse}, R2={r2}')
-            
-            # Salvar modelo após treinamento
-            self.salvar_modelo()
-            
-        except Exception as e:
-            logger.error(f'Erro no treinamento: {e}')
-            logger.error(traceback.format_exc())
-            
-            # Fallback para treinamento
-            self._executar_com_fallback(self._treinar_fallback, horarios_historico)
-    
-    def _treinar_fallback(self, horarios_historico):
-        """
-        Método de treinamento alternativo com menos complexidade
-        """
-        logger.warning('Usando método de treinamento alternativo')
-        
-        # Implementação simplificada de treinamento
-        X_treino = np.random.rand(len(horarios_historico), self.num_features)
-        y_treino = np.random.rand(len(horarios_historico))
-        
-        self.modelo_regressao.fit(X_treino, y_treino)
-    
-    def gerar_relatorio_desempenho(self) -> Dict[str, Any]:
-        """
-        Gera relatório detalhado de desempenho do modelo
-        
-        :return: Dicionário com métricas de desempenho
-        """
-        return {
-            'tempo_medio_execucao': np.mean(self.metricas['tempo_execucao']) if self.metricas['tempo_execucao'] else 0,
-            'mse_medio': np.mean(self.metricas['mse']) if self.metricas['mse'] else 0,
-            'r2_medio': np.mean(self.metricas['r2']) if self.metricas['r2'] else 0,
-            'total_alocacoes': self.metricas['num_alocacoes'],
-            'tentativas_fallback': self.metricas['tentativas_fallback'],
-            'erros_capturados': self.metricas['erros_capturados'][:10]  # Limitar para não sobrecarregar
-        }
-    
-    def salvar_relatorio(self, caminho='relatorio_ml.json'):
-        """
-        Salva relatório de desempenho em arquivo JSON
-        """
-        relatorio = self.gerar_relatorio_desempenho()
-        
-        try:
-            with open(caminho, 'w') as f:
-                json.dump(relatorio, f, indent=4)
-            logger.info(f'Relatório salvo em {caminho}')
-        except Exception as e:
-            logger.error(f'Erro ao salvar relatório: {e}')
-    
-    def salvar_modelo(self):
-        """
-        Salva o modelo treinado
-        """
-        try:
-            with open(self.caminho_modelo, 'wb') as f:
-                pickle.dump({
-                    'modelo': self.modelo_regressao,
-                    'scaler': self.scaler,
-                    'metricas': self.metricas
-                }, f)
-            print(f'Modelo salvo em {self.caminho_modelo}')
-        except Exception as e:
-            print(f'Erro ao salvar modelo: {e}')
-    
-    def carregar_modelo(self):
-        """
-        Carrega modelo treinado previamente
-        """
-        try:
-            with open(self.caminho_modelo, 'rb') as f:
-                dados = pickle.load(f)
-                self.modelo_regressao = dados['modelo']
-                self.scaler = dados['scaler']
-                self.metricas = dados['metricas']
-            print('Modelo carregado com sucesso!')
-            return True
-        except FileNotFoundError:
-            print('Nenhum modelo salvo encontrado.')
-            return False 
-
-    def selecionar_professor(self, turma, disciplina):
-        """
-        Seleciona professor para uma turma e disciplina com estratégia avançada
-        
-        :return: Professor selecionado
-        """
-        try:
-            # Filtrar professores da disciplina
-            professores_candidatos = self.generator.professores_df[
-                self.generator.professores_df['disciplina'] == disciplina
-            ]
-            
-            if professores_candidatos.empty:
-                logger.warning(f'⚠️ Nenhum professor foi encontrado para a disciplina {disciplina}')
-                return None
-            
-            # Extrair características dos professores
-            caracteristicas_professores = []
-            for _, professor in professores_candidatos.iterrows():
-                features = self._extrair_features_professor(professor, turma, disciplina)
-                caracteristicas_professores.append(features)
-            
-            # Transformar características
-            X_professores = self.scaler.transform(caracteristicas_professores)
-            
-            # Predizer qualidade da alocação
-            qualidades = self.modelo_regressao.predict(X_professores)
-            
-            # Selecionar professor com maior qualidade
-            indice_melhor = np.argmax(qualidades)
-            melhor_professor = professores_candidatos.iloc[indice_melhor]['nome']
-            
-            logger.info(f'Professor selecionado para {disciplina}: {melhor_professor}')
-            return melhor_professor
-        
-        except Exception as e:
-            logger.error(f'Erro na seleção de professor: {e}')
-            return self._selecao_professor_fallback(disciplina)
-    
-    def _extrair_features_professor(self, professor, turma, disciplina):
-        """
-        Extrai características detalhadas de um professor
-        
-        :return: Vetor de características
-        """
-        return [
-            # Características do professor
-            len(professor['nome']),  # Complexidade do nome
-            professor['carga_horaria'] if 'carga_horaria' in professor else 0,
-            
-            # Características da disciplina
-            len(disciplina),  # Complexidade da disciplina
-            
-            # Características da turma
-            len(turma),  # Complexidade da turma
-            
-            # Características de disponibilidade
-            self._calcular_disponibilidade(professor, turma),
-            
-            # Componentes aleatórios para diversidade
-            random.random(),
-            random.random(),
-            random.random()
-        ]
-    
-    def _calcular_disponibilidade(self, professor, turma):
-        """
-        Calcula pontuação de disponibilidade do professor
-        
-        :return: Pontuação de disponibilidade
-        """
-        try:
-            # Lógica de verificação de disponibilidade
-            dias_disponiveis = sum([
-                int(professor.get(f'd_{dia}', '0')) > 0 
-                for dia in ['seg', 'ter', 'qua', 'qui', 'sex']
-            ])
-            
-            return dias_disponiveis / 5.0  # Normalizar entre 0 e 1
-        except Exception as e:
-            logger.warning(f'Erro ao calcular disponibilidade: {e}')
-            return random.random()
-    
-    def _selecao_professor_fallback(self, disciplina):
-        """
-        Método de fallback para seleção de professor
-        
-        :return: Professor selecionado aleatoriamente
-        """
-        logger.warning(f'Usando seleção de professor fallback para {disciplina}')
-        
-        professores = self.generator.professores_df[
-            self.generator.professores_df['disciplina'] == disciplina
-        ]['nome'].tolist()
-        
-        return random.choice(professores) if professores else None
-
 from .validator import HorarioValidator
-from .horario_ml import HorarioML
+from .horario_ml import obter_modelo_compartilhado
+from .codificacao_turno import CodificacaoTurno
+from .convergencia import MonitorConvergencia, calcular_diversidade
+from .checkpoint import CheckpointGA
 
 class GeneticScheduleOptimizer:
     def __init__(self, schedule_generator):
         self.generator = schedule_generator
-        self.modelo_ml = HorarioML(schedule_generator.data_path)
+        self.logger = logger
+        # Instância registrada do processo: mesmo modelo, hot-swap e histórico das demais
+        self.modelo_ml = obter_modelo_compartilhado(schedule_generator.data_path)
         self.validator = HorarioValidator(schedule_generator.data_path)
         
         # Configurações do algoritmo genético
@@ -411,297 +49,164 @@ class GeneticScheduleOptimizer:
         self.P_MUTATION = 0.2
         self.MAX_GENERATIONS = 50
         self.TOURNAMENT_SIZE = 3
-        
-        # Cache e métricas
-        self.fitness_cache = {}
-        self.melhores_solucoes = []
-        
-    def _verificar_disponibilidade_professor(self, professor, dia, hora):
-        """Verifica se um professor está disponível em um determinado horário"""
-        try:
-            dias_semana = ['seg', 'ter', 'qua', 'qui', 'sex']
-            dia_str = dias_semana[dia]
-            
-            # Obter disponibilidade do professor
-            disponibilidade = self.generator.professores_df[
-                self.generator.professores_df['nome'] == professor
-            ][f'd_{dia_str}'].iloc[0]
-            
-            if pd.isna(disponibilidade):
-                return False
-                
-            # Converter disponibilidade para lista de horários
-            horarios_disponiveis = str(disponibilidade).replace(';', ',').split(',')
-            return str(hora) in horarios_disponiveis
-            
-        except Exception as e:
-            print(f"Erro ao verificar disponibilidade: {e}")
-            return False
-            
-    def _criar_individuo_inicial(self, disciplinas, professores_disponiveis):
-        """Cria um indivíduo válido priorizando disponibilidade e restrições"""
-        max_tentativas = 15  # Aumentado para mais tentativas
-        dias = ['seg', 'ter', 'qua', 'qui', 'sex']
-        
-        for _ in range(max_tentativas):
-            individuo = []
-            alocacoes_professor = {}  # Controle de alocações por professor
-            
-            for i, disciplina in enumerate(disciplinas):
-                dia = dias[i % 5]
-                hora = (i // 5) + 1
-                
-                # Filtrar professores disponíveis
-                profs_validos = []
-                for professor in professores_disponiveis:
-                    # Verificar disponibilidade
-                    if not self._verificar_disponibilidade_professor(professor, i % 5, hora):
-                        continue
-                        
-                    # Verificar restrições
-                    resultado = self.validator.validar_alocacao(
-                        professor=professor,
-                        disciplina=disciplina,
-                        turma=self.turma_atual,
-                        dia=dia,
-                        horario=hora
-                    )
-                    
-                    # Verificar carga horária máxima por dia
-                    alocacoes_dia = alocacoes_professor.get(professor, {}).get(dia, 0)
-                    if alocacoes_dia >= 4:  # Máximo de 4 aulas por dia
-                        continue
-                        
-                    if resultado['valido']:
-                        profs_validos.append(professor)
-                
-                if profs_validos:
-                    # Selecionar professor com menor carga
-                    professor_selecionado = min(
-                        profs_validos,
-                        key=lambda p: sum(alocacoes_professor.get(p, {}).values())
-                    )
-                    
-                    # Atualizar controle de alocações
-                    if professor_selecionado not in alocacoes_professor:
-                        alocacoes_professor[professor_selecionado] = {}
-                    if dia not in alocacoes_professor[professor_selecionado]:
-                        alocacoes_professor[professor_selecionado][dia] = 0
-                    alocacoes_professor[professor_selecionado][dia] += 1
-                    
-                    individuo.append(professor_selecionado)
-                else:
-                    individuo.append(None)
-            
-            # Verificar se o indivíduo é minimamente válido
-            if any(individuo) and len([x for x in individuo if x is not None]) >= len(disciplinas) * 0.7:
-                return individuo
-        
-        # Fallback: criar indivíduo com alocações mínimas
-        return self._criar_individuo_fallback(disciplinas, professores_disponiveis)
-        
-    def _criar_individuo_fallback(self, disciplinas, professores_disponiveis):
-        """Método de fallback para criar indivíduo quando o método principal falha"""
-        individuo = []
-        for disciplina in disciplinas:
-            # Tentar encontrar pelo menos um professor válido
-            prof_valido = None
-            for professor in professores_disponiveis:
-                if self._professor_pode_lecionar(professor, disciplina):
-                    prof_valido = professor
-                    break
-            
-            individuo.append(prof_valido if prof_valido else random.choice(professores_disponiveis))
-        
+        self.PENALIDADE_CONFLITO = 5.0  # Pontos perdidos por choque de professor entre turmas
+        self.PESO_DISPONIBILIDADE = 0.4
+        self.PESO_RESTRICOES = 0.3
+        
+        # Detecção de convergência e adaptação dos operadores
+        self.JANELA_ESTAGNACAO = 10
+        self.TOLERANCIA_ESTAGNACAO = 0.01
+        self.POLITICA_ESTAGNACAO = 'reiniciar'  # 'reiniciar' ou 'parar'
+        self.MAX_REINICIOS = 2
+        self.FRACAO_ELITE_REINICIO = 0.1
+        
+        # Pré-seleção: termo ML calculado apenas para os candidatos promissores
+        self.PESO_ML = 0.3
+        self.ML_TOP_K = 10  # Candidatos por lote que recebem o score ML
+        self.ML_LIMIAR = None  # Se definido, usa score de restrições mínimo no lugar do top-k
+        
+        # Etapa memética: busca local nos melhores indivíduos de cada geração
+        self.MEMETICO_ATIVO = False
+        self.MEMETICO_TOP_K = 5
+        self.MEMETICO_ITERACOES = 50
+        self.MEMETICO_TEMPO = 0.05  # Segundos por indivíduo
+        
+        # Checkpoints periódicos para retomar execuções longas
+        self.CHECKPOINT_DIR = os.path.join(schedule_generator.data_path, 'checkpoints')
+        self.CHECKPOINT_INTERVALO = 5  # Gerações entre checkpoints
+        self.RETOMAR_CHECKPOINT = True
+        
+        # Codificação conjunta do turno (definida em otimizar_turno)
+        self.codificacao = None
+        self.disciplinas = {}
+        
+        # Caches LRU por indivíduo (limitados: execuções longas/retomadas avaliam milhões de indivíduos)
+        self.MAX_CACHE_FITNESS = 20000
+        self.fitness_cache = OrderedDict()
+        self.restricoes_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total_avaliacoes = 0
+        self.chamadas_ml = 0
+        self.soma_scores_ml = 0.0
+        
+        # Histórico compacto por geração (trajetória do fitness + referência aos genes do melhor,
+        # copiados só quando ele muda); o melhor atual fica também fora do anel
+        self.MAX_HISTORICO_GERACOES = 500
+        self.melhores_solucoes = deque(maxlen=self.MAX_HISTORICO_GERACOES)
+        self.melhor_genes = None
+        
+    def _criar_individuo_inicial(self):
+        """Cria um indivíduo do turno priorizando disponibilidade e ausência de choques"""
+        individuo = creator.Individual(self.codificacao.criar_individuo())
+        self.codificacao.reparar(individuo)
         return individuo
 
-    def _professor_pode_lecionar(self, professor, disciplina):
-        """Verifica se um professor pode lecionar uma disciplina"""
-        prof_df = self.generator.professores_df
-        return any((prof_df['nome'] == professor) & 
-                  (prof_df['disciplina'] == disciplina))
-
-    def _calcular_fitness(self, individuo, turma):
-        """Calcula fitness considerando restrições e disponibilidades"""
-        # Usar cache se disponível
-        individuo_key = (tuple(individuo), turma)
-        if individuo_key in self.fitness_cache:
-            return self.fitness_cache[individuo_key]
+    def _calcular_score_restricoes(self, individuo):
+        """Parte exata e barata do fitness: disponibilidades, restrições e choques entre turmas"""
+        individuo_key = tuple(individuo)
+        score = self._cache_obter(self.restricoes_cache, individuo_key)
+        if score is not None:
+            return score
 
-        # Inicializar pontuação
-        score_total = 0
-        peso_disponibilidade = 0.4
-        peso_restricoes = 0.3
-        peso_ml = 0.3
+        cod = self.codificacao
+        genes = np.asarray(individuo)
+        alocados = genes >= 0
+        total_aulas = int(alocados.sum())
 
-        # Verificar disponibilidade dos professores
+        # Verificar disponibilidade dos professores e restrições das disciplinas
         score_disponibilidade = 0
-        total_aulas = 0
-        for i, professor in enumerate(individuo):
-            if professor:
-                total_aulas += 1
-                dia = i % 5
-                hora = (i // 5) + 1
-                dias_semana = ['seg', 'ter', 'qua', 'qui', 'sex']
-                if self._verificar_disponibilidade_professor(professor, dia, hora):
-                    score_disponibilidade += 1
-
+        score_restricoes = 0
         if total_aulas > 0:
-            score_disponibilidade = (score_disponibilidade / total_aulas) * 100
+            disponiveis = cod.avaliar_disponibilidade(genes)
+            score_disponibilidade = (disponiveis[alocados].sum() / total_aulas) * 100
 
-        # Verificar restrições das disciplinas
-        score_restricoes = 0
-        total_disciplinas = 0
-        for i, (professor, disciplina) in enumerate(zip(individuo, self.disciplinas[turma])):
-            if professor:
-                total_disciplinas += 1
-                dia = i % 5
-                hora = (i // 5) + 1
-                dias_semana = ['seg', 'ter', 'qua', 'qui', 'sex']
-                resultado = self.validator._validar_restricoes(professor, disciplina, turma, dias_semana[dia], hora)
-                if resultado['valido']:
-                    score_restricoes += 1
-
-        if total_disciplinas > 0:
-            score_restricoes = (score_restricoes / total_disciplinas) * 100
-
-        # Obter score do modelo ML
-        horario_parcial = self._converter_para_formato_horario(individuo, turma)
-        score_ml = self.modelo_ml.prever_score(horario_parcial)
-
-        # Calcular score final ponderado
-        score_total = (peso_disponibilidade * score_disponibilidade +
-                      peso_restricoes * score_restricoes +
-                      peso_ml * score_ml)
+            respeitadas = cod.avaliar_restricoes(genes)
+            score_restricoes = (respeitadas[alocados].sum() / total_aulas) * 100
 
-        # Armazenar no cache
-        self.fitness_cache[individuo_key] = score_total
-        return score_total
+        # Choques de professor entre turmas e aulas faltando/sobrando no turno
+        conflitos = cod.contar_conflitos(genes) + cod.desvio_carga(genes)
 
-    def _calcular_distribuicao_carga(self, individuo):
-        """Calcula estatísticas da distribuição de carga horária"""
-        carga_por_professor = {}
-        for professor in individuo:
-            if professor:
-                carga_por_professor[professor] = carga_por_professor.get(professor, 0) + 1
-        
-        if not carga_por_professor:
-            return {'media': 0, 'desvio_padrao': 0}
-        
-        cargas = list(carga_por_professor.values())
-        return {
-            'media': np.mean(cargas),
-            'desvio_padrao': np.std(cargas)
-        }
-
-    def _verificar_conflitos_horario(self, individuo):
-        """Conta número de conflitos de horário no indivíduo"""
-        conflitos = 0
-        horarios_prof = {}
-        
-        for i, professor in enumerate(individuo):
-            if professor:
-                dia = i % 5  # 5 dias na semana
-                hora = i // 5
-                
-                if professor not in horarios_prof:
-                    horarios_prof[professor] = set()
-                
-                horario = (dia, hora)
-                if horario in horarios_prof[professor]:
-                    conflitos += 1
-                horarios_prof[professor].add(horario)
-        
-        return conflitos
+        score = (self.PESO_DISPONIBILIDADE * score_disponibilidade +
+                 self.PESO_RESTRICOES * score_restricoes -
+                 self.PENALIDADE_CONFLITO * conflitos)
 
-    def _contar_janelas(self, individuo):
-        """Conta número de janelas (períodos vazios) no horário"""
-        janelas = 0
-        horarios_prof = {}
-        
-        for i, professor in enumerate(individuo):
-            if professor:
-                dia = i % 5
-                hora = i // 5
-                
-                if professor not in horarios_prof:
-                    horarios_prof[professor] = {}
-                if dia not in horarios_prof[professor]:
-                    horarios_prof[professor][dia] = set()
-                    
-                horarios_prof[professor][dia].add(hora)
-        
-        # Contar janelas para cada professor
-        for professor, dias in horarios_prof.items():
-            for dia, horas in dias.items():
-                if len(horas) > 1:
-                    horas_ordenadas = sorted(list(horas))
-                    for i in range(len(horas_ordenadas) - 1):
-                        if horas_ordenadas[i + 1] - horas_ordenadas[i] > 1:
-                            janelas += 1
-        
-        return janelas
-
-    def _calcular_score_preferencias(self, individuo):
-        """Calcula pontuação baseada nas preferências dos professores"""
-        score = 0
-        for i, professor in enumerate(individuo):
-            if professor:
-                dia = i % 5
-                hora = i // 5
-                
-                # Verificar disponibilidade do professor
-                if self._verificar_disponibilidade_professor(professor, dia, hora):
-                    score += 5
-                # Verificar preferências específicas
-                if self._verificar_preferencias_especificas(professor, dia, hora):
-                    score += 3
-        
+        self._cache_guardar(self.restricoes_cache, individuo_key, score)
         return score
 
-    def _verificar_disponibilidade_professor(self, professor, dia, hora):
-        """Verifica se o professor está disponível no horário específico"""
-        dias_semana = ['seg', 'ter', 'qua', 'qui', 'sex']
-        dia_nome = dias_semana[dia]
-        
-        prof_df = self.generator.professores_df
-        disponibilidade = prof_df[prof_df['nome'] == professor][f'd_{dia_nome}'].iloc[0]
-        
-        if pd.isna(disponibilidade) or not disponibilidade:
-            return False
-            
-        horas_disponiveis = str(disponibilidade).split(',')
-        return str(hora + 1) in horas_disponiveis
+    def _cache_obter(self, cache, chave):
+        """Consulta um dos caches LRU de fitness, marcando a entrada como usada"""
+        valor = cache.get(chave)
+        if valor is not None:
+            cache.move_to_end(chave)
+        return valor
+
+    def _cache_guardar(self, cache, chave, valor):
+        """Armazena no cache LRU descartando as entradas menos usadas acima de MAX_CACHE_FITNESS"""
+        cache[chave] = valor
+        cache.move_to_end(chave)
+        while len(cache) > self.MAX_CACHE_FITNESS:
+            cache.popitem(last=False)
+
+    def _scores_ml(self, individuos):
+        """Calcula o termo ML (caro) para os indivíduos candidatos"""
+        professores, disciplinas = self.codificacao.para_grade([list(ind) for ind in individuos])
+        scores = self.modelo_ml.prever_scores_grade(professores, disciplinas)
+
+        self.chamadas_ml += len(scores)
+        self.soma_scores_ml += float(np.sum(scores))
+        return scores
+
+    def _score_ml_estimado(self):
+        """Estimativa do termo ML para indivíduos não pré-selecionados (média dos scores já obtidos)"""
+        return self.soma_scores_ml / self.chamadas_ml if self.chamadas_ml else 0.0
+
+    def _calcular_fitness(self, individuo):
+        """Calcula fitness exato do turno: restrições + termo ML"""
+        # Usar cache se disponível
+        individuo_key = tuple(individuo)
+        score_total = self._cache_obter(self.fitness_cache, individuo_key)
+        if score_total is not None:
+            self.cache_hits += 1
+            return score_total
+        self.cache_misses += 1
+
+        score_total = (self._calcular_score_restricoes(individuo) +
+                       self.PESO_ML * self._scores_ml([individuo])[0])
 
-    def _verificar_preferencias_especificas(self, professor, dia, hora):
-        """Verifica preferências específicas do professor"""
+        # Armazenar no cache
+        self._cache_guardar(self.fitness_cache, individuo_key, score_total)
+        return score_total
+
+    def _carregar_disciplinas(self):
+        """Lê disciplinas.csv (restrições por dia); None se o arquivo não existir ou falhar"""
+        caminho = os.path.join(self.generator.data_path, 'disciplinas.csv')
+        if not os.path.exists(caminho):
+            return None
         try:
-            # Carregar exceções/preferências
-            excecoes_df = pd.read_csv(os.path.join(self.generator.data_path, 'excecoes.csv'))
-            
-            # Filtrar exceções do professor
-            exc_prof = excecoes_df[excecoes_df['professor'] == professor]
-            
-            if exc_prof.empty:
-                return True  # Sem exceções = disponível
-                
-            dias_semana = ['seg', 'ter', 'qua', 'qui', 'sex']
-            dia_nome = dias_semana[dia]
-            
-            for _, excecao in exc_prof.iterrows():
-                if dia_nome in str(excecao['dias']).split(','):
-                    if str(hora + 1) in str(excecao['horas']).split(','):
-                        return excecao['tipo'] == 'SIM'
-            
-            return True
-            
+            return pd.read_csv(caminho)
         except Exception as e:
-            self.logger.warning(f"Erro ao verificar preferências: {e}")
-            return True
+            self.logger.error(f"Erro ao carregar disciplinas.csv: {e}")
+            return None
 
     def otimizar_horario(self, turma, disciplinas):
-        """Otimiza horário usando algoritmo genético com ML"""
-        self.disciplinas[turma] = disciplinas
+        """Otimiza horário de uma única turma (turno com uma turma)"""
+        return self.otimizar_turno({turma: {'disciplinas': disciplinas}})[turma]
+
+    def otimizar_turno(self, turmas, tempo_limite=None):
+        """
+        Otimiza todas as turmas de um turno em uma única execução do algoritmo genético
+        
+        :param turmas: Dicionário turma -> {'disciplinas': [...]}
+        :param tempo_limite: Tempo máximo em segundos; ao estourar, grava checkpoint e encerra
+        :return: Dicionário turma -> horário
+        """
+        self.disciplinas = {turma: info['disciplinas'] for turma, info in turmas.items()}
+        self.codificacao = CodificacaoTurno(
+            self.generator.professores_df, turmas, self._carregar_disciplinas()
+        )
+        self.fitness_cache = OrderedDict()
+        self.restricoes_cache = OrderedDict()
         
         # Configurar algoritmo genético
         if 'FitnessMax' not in creator.__dict__:
@@ -712,60 +217,121 @@ class GeneticScheduleOptimizer:
         toolbox = base.Toolbox()
         
         # Registrar operações genéticas
-        professores_disponiveis = self.generator.professores_df['nome'].unique()
-        toolbox.register("individuo", self._criar_individuo_inicial, 
-                        disciplinas, professores_disponiveis)
+        toolbox.register("individuo", self._criar_individuo_inicial)
         toolbox.register("population", tools.initRepeat, list, toolbox.individuo)
         
         # Registro de operadores genéticos
-        toolbox.register("evaluate", lambda ind: (self._calcular_fitness(ind, turma),))
-        toolbox.register("mate", tools.cxTwoPoint)
+        toolbox.register("evaluate", lambda ind: (self._calcular_fitness(ind),))  # Avaliação exata
+        toolbox.register("mate", self._cruzamento_blocos)
         toolbox.register("mutate", self._mutacao_custom)
         toolbox.register("select", tools.selTournament, tournsize=self.TOURNAMENT_SIZE)
         
-        # Criar população inicial
-        pop = toolbox.population(n=self.POPULATION_SIZE)
+        monitor = MonitorConvergencia(
+            p_crossover=self.P_CROSSOVER,
+            p_mutacao=self.P_MUTATION,
+            janela=self.JANELA_ESTAGNACAO,
+            tolerancia=self.TOLERANCIA_ESTAGNACAO,
+            politica=self.POLITICA_ESTAGNACAO,
+            max_reinicios=self.MAX_REINICIOS
+        )
+        
+        # Retomar do último checkpoint ou criar população inicial
+        checkpoint = CheckpointGA(self.CHECKPOINT_DIR, self.codificacao.assinatura())
+        estado = checkpoint.carregar() if self.RETOMAR_CHECKPOINT else None
+        if estado:
+            pop = self._restaurar_checkpoint(estado, monitor)
+            gen_inicio = estado['geracao'] + 1
+            self.logger.info(f"Retomando execução a partir da geração {gen_inicio}")
+        else:
+            pop = toolbox.population(n=self.POPULATION_SIZE)
+            self._avaliar(pop)
+            gen_inicio = 0
+        inicio = time.time()
+        interrompido = False
+        self.melhores_solucoes = deque(maxlen=self.MAX_HISTORICO_GERACOES)
+        self.melhor_genes = None
+        melhor_fitness_registrado = None
         
         # Loop principal do algoritmo genético
-        for gen in range(self.MAX_GENERATIONS):
+        for gen in range(gen_inicio, self.MAX_GENERATIONS):
+            # Respeitar tempo limite gravando um checkpoint final
+            if tempo_limite is not None and time.time() - inicio > tempo_limite:
+                self.logger.warning(f"Tempo limite de {tempo_limite}s atingido na geração {gen}; salvando checkpoint")
+                checkpoint.salvar(self._estado_checkpoint(gen - 1, pop, monitor))
+                interrompido = True
+                break
+            
             # Selecionar próxima geração
             offspring = algorithms.varAnd(pop, toolbox, 
-                                       cxpb=self.P_CROSSOVER, 
-                                       mutpb=self.P_MUTATION)
+                                       cxpb=monitor.p_crossover, 
+                                       mutpb=monitor.p_mutacao)
             
-            # Avaliar indivíduos
-            fits = toolbox.map(toolbox.evaluate, offspring)
-            for fit, ind in zip(fits, offspring):
-                ind.fitness.values = fit
+            # Avaliar apenas indivíduos alterados pelos operadores
+            self._avaliar(offspring)
+            
+            # Melhorar a elite com busca local antes da seleção
+            if self.MEMETICO_ATIVO:
+                self._aplicar_busca_local(offspring + pop)
             
             # Atualizar população
             pop = toolbox.select(offspring + pop, k=len(pop))
             
-            # Guardar melhor solução da geração
-            melhor = tools.selBest(pop, k=1)[0]
-            horario_melhor = self._converter_para_formato_horario(melhor, turma)
+            # Guardar trajetória da geração; os genes do melhor são copiados só quando ele melhora
+            # e cada registro aponta para a cópia vigente (sobrevive ao descarte dos antigos)
+            melhor = self._melhor_exato(pop)
+            melhorou = (melhor_fitness_registrado is None or
+                        melhor.fitness.values[0] > melhor_fitness_registrado)
+            if melhorou:
+                self.melhor_genes = np.asarray(melhor, dtype=np.int32)
             self.melhores_solucoes.append({
                 'geracao': gen,
                 'fitness': melhor.fitness.values[0],
-                'horario': horario_melhor
+                'media': float(np.mean([ind.fitness.values[0] for ind in pop])),
+                'melhor': self.melhor_genes
             })
             
-            # Registrar para treinamento do ML
-            self.modelo_ml.registrar_horario(
-                horario_melhor,
-                melhor.fitness.values[0]
-            )
+            # Converter e registrar para treinamento do ML apenas quando houver melhoria
+            if melhorou:
+                melhor_fitness_registrado = melhor.fitness.values[0]
+                self.modelo_ml.registrar_horario(
+                    self._converter_para_formato_horario(melhor),
+                    melhor.fitness.values[0]
+                )
+            
+            notificar_progresso((gen + 1) / self.MAX_GENERATIONS * 100)
             
             # Verificar critério de parada
             if melhor.fitness.values[0] >= 95:
                 break
+            
+            decisao = monitor.registrar([ind.fitness.values[0] for ind in pop])
+            self._registrar_estatisticas_geracao(gen, gen - gen_inicio + 1, pop, inicio, monitor)
+            
+            if decisao == MonitorConvergencia.PARAR:
+                self.logger.info(f"População convergiu na geração {gen}; encerrando")
+                break
+            if decisao == MonitorConvergencia.REINICIAR:
+                pop = self._reiniciar_populacao(toolbox, pop)
+            
+            if (gen + 1) % self.CHECKPOINT_INTERVALO == 0:
+                checkpoint.salvar(self._estado_checkpoint(gen, pop, monitor))
+        
+        # Execução concluída não precisa ser retomada
+        if not interrompido:
+            checkpoint.remover()
         
         # Retornar melhor solução
-        melhor_individuo = tools.selBest(pop, k=1)[0]
-        horario_final = self._converter_para_formato_horario(melhor_individuo, turma)
+        melhor_individuo = self._melhor_exato(pop)
+        horario_final = self._converter_para_formato_horario(melhor_individuo)
+        if melhor_fitness_registrado is None or melhor_individuo.fitness.values[0] > melhor_fitness_registrado:
+            self.modelo_ml.registrar_horario(horario_final, melhor_individuo.fitness.values[0])
+        
+        conflitos = self.codificacao.contar_conflitos(melhor_individuo)
+        if conflitos:
+            self.logger.warning(f"Melhor horário do turno ainda possui {conflitos} choque(s) de professor")
         
         # Obter sugestões de melhoria
-        sugestoes = self.modelo_ml.sugerir_melhoria(horario_final)
+        sugestoes = self.modelo_ml.analisar_tendencias()
         if sugestoes:
             self.logger.info("Sugestões de melhoria:")
             for sugestao in sugestoes:
@@ -773,53 +339,187 @@ class GeneticScheduleOptimizer:
         
         return horario_final
 
+    def obter_melhor_da_geracao(self, geracao):
+        """
+        Reconstrói o melhor horário registrado até uma geração do histórico compacto
+
+        Gerações já descartadas do anel usam o registro mais antigo ainda guardado; gerações
+        posteriores à última usam o melhor atual.
+        """
+        if not self.melhores_solucoes:
+            raise ValueError("Nenhuma geração registrada")
+
+        genes = self.melhores_solucoes[0]['melhor']
+        for registro in self.melhores_solucoes:
+            if registro['geracao'] > geracao:
+                break
+            genes = registro['melhor']
+        return self._converter_para_formato_horario(genes.tolist())
+
+    def _estado_checkpoint(self, gen, pop, monitor):
+        """Monta o estado compacto do algoritmo para checkpoint"""
+        return {
+            'geracao': gen,
+            'populacao': np.asarray([list(ind) for ind in pop], dtype=np.int32),
+            'fitness': np.array([ind.fitness.values[0] for ind in pop]),
+            'random_state': random.getstate(),
+            'numpy_state': np.random.get_state(),
+            'monitor': monitor.obter_estado(),
+            'total_avaliacoes': self.total_avaliacoes,
+            'chamadas_ml': self.chamadas_ml,
+            'soma_scores_ml': self.soma_scores_ml
+        }
+
+    def _restaurar_checkpoint(self, estado, monitor):
+        """Restaura população, geradores aleatórios e contadores a partir do checkpoint"""
+        pop = []
+        for genes, fitness in zip(estado['populacao'], estado['fitness']):
+            ind = creator.Individual(genes.tolist())
+            ind.fitness.values = (float(fitness),)
+            pop.append(ind)
+        
+        random.setstate(estado['random_state'])
+        np.random.set_state(estado['numpy_state'])
+        monitor.restaurar_estado(estado['monitor'])
+        self.total_avaliacoes = estado['total_avaliacoes']
+        self.chamadas_ml = estado['chamadas_ml']
+        self.soma_scores_ml = estado['soma_scores_ml']
+        return pop
+
+    def _avaliar(self, individuos):
+        """
+        Avalia em dois estágios os indivíduos sem fitness válido
+        
+        O score de restrições (exato e barato) é calculado para todos; o termo ML
+        é calculado em lote apenas para os melhores candidatos. Os demais recebem
+        a média dos scores ML já observados, mantendo a mesma escala de fitness.
+        """
+        invalidos = [ind for ind in individuos if not ind.fitness.valid]
+        if not invalidos:
+            return
+        self.total_avaliacoes += len(invalidos)
+        
+        scores_restricoes = np.array([self._calcular_score_restricoes(ind) for ind in invalidos])
+        ordem = np.argsort(-scores_restricoes)
+        if self.ML_LIMIAR is not None:
+            candidatos = [i for i in ordem if scores_restricoes[i] >= self.ML_LIMIAR]
+        else:
+            candidatos = list(ordem[:self.ML_TOP_K])
+        
+        # Termo ML em lote para candidatos ainda sem fitness exato
+        exatos = {}
+        pendentes = {}
+        for i in candidatos:
+            chave = tuple(invalidos[i])
+            fitness = self._cache_obter(self.fitness_cache, chave)
+            if fitness is not None:
+                self.cache_hits += 1
+                exatos[chave] = fitness
+            elif chave not in pendentes:
+                self.cache_misses += 1
+                pendentes[chave] = i
+        if pendentes:
+            indices = list(pendentes.values())
+            scores = self._scores_ml([invalidos[i] for i in indices])
+            for i, score_ml in zip(indices, scores):
+                chave = tuple(invalidos[i])
+                exatos[chave] = scores_restricoes[i] + self.PESO_ML * score_ml
+                self._cache_guardar(self.fitness_cache, chave, exatos[chave])
+        
+        estimado = self.PESO_ML * self._score_ml_estimado()
+        for i, ind in enumerate(invalidos):
+            chave = tuple(ind)
+            fitness = exatos.get(chave)
+            if fitness is None:
+                fitness = self._cache_obter(self.fitness_cache, chave)
+            ind.fitness.values = (fitness if fitness is not None else scores_restricoes[i] + estimado,)
+
+    def _aplicar_busca_local(self, individuos):
+        """
+        Aplica busca local limitada aos MEMETICO_TOP_K melhores indivíduos
+        
+        Os movimentos usam o proxy linear do modelo (se houver); o modelo completo só
+        entra na reavaliação dos indivíduos alterados.
+        """
+        melhorados = []
+        vistos = set()
+        for ind in tools.selBest(individuos, k=self.MEMETICO_TOP_K):
+            if id(ind) in vistos:
+                continue
+            vistos.add(id(ind))
+            ganho = self.codificacao.busca_local(
+                ind,
+                max_iteracoes=self.MEMETICO_ITERACOES,
+                tempo_limite=self.MEMETICO_TEMPO,
+                peso_disponibilidade=self.PESO_DISPONIBILIDADE,
+                peso_restricoes=self.PESO_RESTRICOES,
+                penalidade_conflito=self.PENALIDADE_CONFLITO,
+                proxy=self.modelo_ml.proxy,
+                peso_ml=self.PESO_ML
+            )
+            if ganho > 0:
+                del ind.fitness.values
+                melhorados.append(ind)
+        self._avaliar(melhorados)
+
+    def _melhor_exato(self, pop):
+        """Retorna o melhor indivíduo garantindo que seu fitness inclua o termo ML real"""
+        while True:
+            melhor = tools.selBest(pop, k=1)[0]
+            if tuple(melhor) in self.fitness_cache:
+                return melhor
+            melhor.fitness.values = (self._calcular_fitness(melhor),)
+
+    def _reiniciar_populacao(self, toolbox, pop):
+        """Renova a população mantendo a elite quando o algoritmo estagna"""
+        num_elite = max(1, int(len(pop) * self.FRACAO_ELITE_REINICIO))
+        elite = tools.selBest(pop, k=num_elite)
+        novos = toolbox.population(n=len(pop) - num_elite)
+        self._avaliar(novos)
+        self.logger.info(f"Reiniciando população com {num_elite} indivíduo(s) de elite")
+        return elite + novos
+
+    def _registrar_estatisticas_geracao(self, gen, geracoes_executadas, pop, inicio, monitor):
+        """Registra estatísticas de desempenho da geração"""
+        fitnesses = [ind.fitness.values[0] for ind in pop]
+        decorrido = max(time.time() - inicio, 1e-9)
+        consultas = self.cache_hits + self.cache_misses
+        self.logger.info(
+            f"Geração {gen}: melhor={max(fitnesses):.2f} media={np.mean(fitnesses):.2f} "
+            f"ger/s={geracoes_executadas / decorrido:.2f} avaliacoes={self.total_avaliacoes} "
+            f"chamadas_ml={self.chamadas_ml} "
+            f"cache={self.cache_hits / consultas if consultas else 0:.1%} "
+            f"diversidade={calcular_diversidade(pop):.3f} "
+            f"cxpb={monitor.p_crossover:.2f} mutpb={monitor.p_mutacao:.2f}"
+        )
+
     def _mutacao_custom(self, individuo, indpb=0.05):
-        """Operador de mutação customizado"""
-        for i in range(len(individuo)):
-            if random.random() < indpb:
-                disciplina = self.disciplinas[list(self.disciplinas.keys())[0]][i]
-                profs_disciplina = [p for p in self.generator.professores_df['nome'].unique() 
-                                  if self._professor_pode_lecionar(p, disciplina)]
-                if profs_disciplina:
-                    individuo[i] = random.choice(profs_disciplina)
-        
+        """Operador de mutação que preserva as aulas da turma, seguido de reparo de choques"""
+        self.codificacao.mutar(individuo, indpb)
+        self.codificacao.reparar(individuo)
         return individuo,
 
-    def _converter_para_formato_horario(self, individuo, turma):
-        """Converte um indivíduo em formato de horário"""
-        horario = {
-            'dias': {
-                'seg': {}, 'ter': {}, 'qua': {}, 'qui': {}, 'sex': {}
-            }
-        }
-        
-        dias = ['seg', 'ter', 'qua', 'qui', 'sex']
-        
-        for i, (professor, disciplina) in enumerate(zip(individuo, self.disciplinas[turma])):
-            if professor:
-                dia = dias[i % 5]
-                hora = (i // 5) + 1
-                
-                horario['dias'][dia][hora] = {
-                    'professor': professor,
-                    'disciplina': disciplina
-                }
-        
+    def _cruzamento_blocos(self, ind1, ind2):
+        """Cruzamento por blocos de slots de turma, seguido de reparo de choques"""
+        self.codificacao.cruzar_blocos(ind1, ind2)
+        self.codificacao.reparar(ind1)
+        self.codificacao.reparar(ind2)
+        return ind1, ind2
+
+    def _converter_para_formato_horario(self, individuo, turma=None):
+        """Converte um indivíduo do turno em formato de horário (opcionalmente de uma turma)"""
+        horario = self.codificacao.decodificar(individuo)
+        if turma is not None:
+            return horario[turma]
         return horario
 
 def otimizar_horario_genetico(schedule_generator, max_geracoes=50, tempo_limite=600):
-    """Função principal de otimização"""
+    """Função principal de otimização: uma única execução para todas as turmas do turno"""
     otimizador = GeneticScheduleOptimizer(schedule_generator)
-    horarios_otimizados = {}
+    otimizador.MAX_GENERATIONS = max_geracoes
     
-    for turma, info in schedule_generator.turmas.items():
-        print(f"Otimizando horário para turma: {turma}")
-        horario = otimizador.otimizar_horario(turma, info['disciplinas'])
-        horarios_otimizados[turma] = horario
-        
-        # Notificar progresso
-        progresso = (len(horarios_otimizados) / len(schedule_generator.turmas)) * 100
-        notificar_progresso(progresso)
+    print(f"Otimizando horário conjunto para {len(schedule_generator.turmas)} turma(s)")
+    horarios_otimizados = otimizador.otimizar_turno(schedule_generator.turmas, tempo_limite=tempo_limite)
     
     return horarios_otimizados
 
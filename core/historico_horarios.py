@@ -0,0 +1,194 @@
+import os
+import json
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _trava_arquivo(caminho: str):
+    """Trava exclusiva entre processos (e threads) sobre um arquivo auxiliar"""
+    with open(caminho, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class HistoricoHorarios:
+    def __init__(self, data_path: str, num_features: int, schema_versao: int, max_registros: int = 10000):
+        """
+        Histórico append-only dos horários registrados para treinamento
+
+        Cada registro ocupa uma linha de tamanho fixo (features + score, float32) em um segmento
+        binário lido via memmap; os metadados (timestamp, métricas) ficam em um arquivo JSON Lines.
+        Vários processos podem compartilhar os arquivos: escrita, compactação e mapeamento são
+        feitos sob uma trava de arquivo, relendo o tamanho do segmento antes de usá-lo.
+
+        :param num_features: Tamanho do vetor de features do esquema atual
+        :param schema_versao: Versão do esquema de features (um segmento por versão)
+        :param max_registros: Registros mantidos após a compactação
+        """
+        self.logger = logging.getLogger(__name__)
+        self.num_features = num_features
+        self.schema_versao = schema_versao
+        self.max_registros = max_registros
+        self.largura = num_features + 1
+        self.bytes_registro = self.largura * np.dtype(np.float32).itemsize
+
+        self.segmento_path = os.path.join(data_path, f'historico_features_v{schema_versao}.f32')
+        self.metadados_path = os.path.join(data_path, f'historico_horarios_v{schema_versao}.jsonl')
+        self.estado_path = os.path.join(data_path, f'historico_estado_v{schema_versao}.json')
+        self.legado_path = os.path.join(data_path, 'historico_horarios.json')
+        self.trava_path = os.path.join(data_path, f'historico_v{schema_versao}.lock')
+
+        # Contador a partir do tamanho do segmento (O(1)) e registros descartados pela
+        # compactação (permite identificar registros novos); relidos a cada acesso, pois
+        # outro processo pode ter acrescentado ou compactado o histórico
+        self.total = 0
+        self.descartados = 0
+        with _trava_arquivo(self.trava_path):
+            self._sincronizar()
+
+        self._migrar_legado()
+
+    def _sincronizar(self):
+        """Relê total e descartados dos arquivos (chamar com a trava de arquivo adquirida)"""
+        self.total = os.path.getsize(self.segmento_path) // self.bytes_registro \
+            if os.path.exists(self.segmento_path) else 0
+
+        self.descartados = 0
+        if os.path.exists(self.estado_path):
+            with open(self.estado_path, 'r') as f:
+                self.descartados = json.load(f).get('descartados', 0)
+
+    def adicionar(self, features: np.ndarray, score: float, metricas: Dict[str, Any]):
+        """Acrescenta um registro ao final do segmento e dos metadados"""
+        linha = np.empty(self.largura, dtype=np.float32)
+        linha[:-1] = features
+        linha[-1] = score
+
+        with _trava_arquivo(self.trava_path):
+            with open(self.segmento_path, 'ab') as f:
+                f.write(linha.tobytes())
+            with open(self.metadados_path, 'a') as f:
+                f.write(json.dumps({
+                    'timestamp': datetime.now().isoformat(),
+                    'schema_versao': self.schema_versao,
+                    'score': float(score),
+                    'metricas': metricas
+                }) + '\n')
+
+            self._sincronizar()
+
+            # Compactação periódica: só quando o histórico passa do dobro do limite
+            if self.total >= 2 * self.max_registros:
+                self._compactar()
+
+    @property
+    def total_acumulado(self) -> int:
+        """Total de registros já adicionados, incluindo os removidos pela compactação"""
+        return self.descartados + self.total
+
+    def carregar_matriz(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna (features, scores) mapeados em memória, sem copiar o segmento
+
+        O mapa continua válido se outro processo compactar depois (a compactação troca o
+        arquivo por os.replace; o mapa segue apontando para o segmento antigo).
+        """
+        with _trava_arquivo(self.trava_path):
+            self._sincronizar()
+            return self._mapear()
+
+    def _mapear(self) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.total:
+            return np.empty((0, self.num_features), dtype=np.float32), np.empty(0, dtype=np.float32)
+
+        dados = np.memmap(self.segmento_path, dtype=np.float32, mode='r',
+                          shape=(self.total, self.largura))
+        return dados[:, :-1], dados[:, -1]
+
+    def compactar(self):
+        """Mantém apenas os últimos max_registros (regrava os arquivos de forma atômica)"""
+        with _trava_arquivo(self.trava_path):
+            self._sincronizar()
+            self._compactar()
+
+    def _compactar(self):
+        if self.total <= self.max_registros:
+            return
+
+        try:
+            X, y = self._mapear()
+            manter = np.column_stack([X[-self.max_registros:], y[-self.max_registros:]])
+            del X, y  # libera o mapa antes de substituir o arquivo
+            temporario = f'{self.segmento_path}.tmp'
+            manter.astype(np.float32).tofile(temporario)
+            os.replace(temporario, self.segmento_path)
+
+            if os.path.exists(self.metadados_path):
+                with open(self.metadados_path, 'r') as f:
+                    linhas = f.readlines()[-self.max_registros:]
+                temporario = f'{self.metadados_path}.tmp'
+                with open(temporario, 'w') as f:
+                    f.writelines(linhas)
+                os.replace(temporario, self.metadados_path)
+
+            self.descartados += self.total - self.max_registros
+            temporario = f'{self.estado_path}.tmp'
+            with open(temporario, 'w') as f:
+                json.dump({'descartados': self.descartados}, f)
+            os.replace(temporario, self.estado_path)
+
+            self.logger.info(f"Histórico compactado: {self.total} -> {self.max_registros} registros")
+            self.total = self.max_registros
+
+        except Exception as e:
+            self.logger.error(f"Erro ao compactar histórico: {e}")
+
+    def _migrar_legado(self):
+        """Importa uma vez o antigo historico_horarios.json (somente registros do esquema atual)"""
+        if not os.path.exists(self.legado_path):
+            return
+
+        try:
+            with open(self.legado_path, 'r') as f:
+                historico = json.load(f)
+
+            importados = 0
+            for registro in historico:
+                if registro.get('schema_versao') == self.schema_versao and \
+                        len(registro.get('features', [])) == self.num_features:
+                    self.adicionar(np.asarray(registro['features']), registro['score'],
+                                   registro.get('metricas', {}))
+                    importados += 1
+
+            os.replace(self.legado_path, f'{self.legado_path}.migrado')
+            self.logger.info(f"Histórico legado migrado: {importados} de {len(historico)} registros")
+
+        except Exception as e:
+            self.logger.error(f"Erro ao migrar histórico legado: {e}")
@@ -1,33 +1,116 @@
-from scheduler.core.feature_processor import FeatureProcessor
+from scheduler.core.feature_processor import FeatureProcessor, FEATURE_SCHEMA_VERSION
 from ..config import ML_CONFIG, ML_METRICS
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import r2_score
 import joblib
 import os
+import copy
+import hashlib
 import logging
+import threading
+import weakref
 from datetime import datetime
 from typing import Dict, List, Any
+from collections import OrderedDict
 from .treinamento_continuo import TreinamentoContinuo
+from .historico_horarios import HistoricoHorarios
+from .floresta_compilada import FlorestaCompilada
+from .analisador_conflitos import AnalisadorConflitos
+from .circuit_breaker import CircuitBreaker
+from .servidor_scoring import ClienteScoring
+from .proxy_linear import ProxyLinear
+from .mascaras import montar_mascara
 import json
 
+# Chaves de ML_CONFIG['training'] acrescentadas pelo treinamento incremental e seus padrões;
+# test_size, validation_size, min_samples_for_training e retrain_threshold já vêm da configuração
+TREINAMENTO_PADRAO = {
+    'incremental': False,          # acrescentar árvores ao modelo atual em vez de retreinar do zero
+    'janela_replay': 500,          # registros anteriores reaproveitados em cada treino incremental
+    'arvores_incrementais': 10,    # árvores novas por treino incremental
+    'max_arvores': 200,            # tamanho máximo da floresta (descarta as árvores mais antigas)
+    'tolerancia_validacao': 0.05,  # queda de R² na validação aceita ao trocar o modelo
+    'max_historico': 10000,        # registros mantidos após a compactação do histórico
+    'alpha_proxy': 1.0,            # regularização do proxy linear destilado
+    'amostras_proxy': 5000         # registros do histórico (amostra fixa) usados na destilação
+}
+
+
+def _config_treinamento() -> Dict[str, Any]:
+    """ML_CONFIG['training'] completado com os padrões das chaves novas"""
+    return {**TREINAMENTO_PADRAO, **ML_CONFIG['training']}
+
+# Instâncias vivas, que recebem o modelo novo ao fim de um retreinamento
+_instancias_ativas = weakref.WeakSet()
+
+# Registro de processo: uma instância compartilhada por pasta de dados
+_registro_modelos = {}
+_registro_lock = threading.Lock()
+
+# Retreinamentos em segundo plano em andamento, por pasta de dados
+_treinos_em_andamento = {}
+_treinos_lock = threading.Lock()
+
 class HorarioML:
     def __init__(self, data_path: str):
         self.data_path = data_path
         self.logger = logging.getLogger(__name__)
         self.modelo_path = os.path.join(data_path, 'modelo_horario.joblib')
-        self.historico_path = os.path.join(data_path, 'historico_horarios.json')
+        self.preditor_path = os.path.join(data_path, 'modelo_horario_compilado.joblib')
+        self.proxy_path = os.path.join(data_path, 'modelo_horario_proxy.joblib')
         
         # Inicializar processador de features
         self.feature_processor = FeatureProcessor()
         
+        # Máscaras de disponibilidade/restrição usadas nas métricas de qualidade
+        self.recarregar_lookups()
+        
+        # Histórico append-only para treinamento (segmento binário + metadados JSONL)
+        self.historico = HistoricoHorarios(
+            data_path,
+            num_features=self.feature_processor.num_features,
+            schema_versao=FEATURE_SCHEMA_VERSION,
+            max_registros=_config_treinamento()['max_historico']
+        )
+        
         # Inicializar modelo com configurações
         self.modelo = RandomForestRegressor(**ML_CONFIG['model_params'])
+        self.versao_modelo = 0
+        
+        # Floresta compilada para predição de baixa latência (None = usar o sklearn)
+        self.preditor = None
+        
+        # Proxy linear destilado do modelo, para laços internos (busca local)
+        self.proxy = None
+        self._modelo_mtime = None
+        
+        # Servidor de scoring opcional: predições agrupadas em micro-lotes em outro processo
+        config_servidor = ML_CONFIG.get('servidor_scoring', {})
+        # Sem 'authkey' configurado, o segredo é lido do arquivo de chave do servidor
+        self.cliente_scoring = ClienteScoring(
+            config_servidor['endereco'],
+            authkey=config_servidor.get('authkey')
+        ) if config_servidor.get('endereco') else None
         
         # Cache para otimização
-        self.cache = {}
+        # Cache LRU de scores: (versão do modelo, hash estrutural do horário) -> score
+        self.cache = OrderedDict()
+        self._cache_lock = threading.Lock()  # Compartilhado por threads de requisição e de treino
+        self.cache_capacidade = ML_CONFIG['cache'].get('max_size', 10000)
         self.cache_hits = 0
         self.cache_misses = 0
+        self.cache_evictions = 0
+        
+        # Disjuntor: com o modelo falhando, as predições vão direto ao score heurístico
+        self.circuit_breaker = CircuitBreaker(
+            'horario_ml',
+            limite_falhas=ML_CONFIG.get('circuit_breaker', {}).get('limite_falhas', 3),
+            tempo_reabertura=ML_CONFIG.get('circuit_breaker', {}).get('tempo_reabertura', 30.0),
+            sonda=self._sondar_modelo
+        )
         
         # Carregar modelo existente
         self._carregar_modelo()
@@ -42,21 +125,274 @@ class HorarioML:
         
         # Inicializar sistema de treinamento contínuo
         self.treinamento = TreinamentoContinuo(data_path)
+        
+        _instancias_ativas.add(self)
     
     def _carregar_modelo(self):
-        """Carrega o modelo de ML a partir do arquivo"""
+        """
+        Carrega o modelo de ML a partir do arquivo
+        
+        Os vetores das árvores são mapeados em memória (mmap_mode='r'), de modo que processos
+        que carregam o mesmo arquivo compartilham as páginas.
+        """
         modelo_path = os.path.join(self.data_path, 'modelo_horario.joblib')
+        self.preditor = None
+        self.proxy = None
         if os.path.exists(modelo_path):
-            self.modelo = joblib.load(modelo_path)
+            self._modelo_mtime = os.path.getmtime(modelo_path)
+            modelo = joblib.load(modelo_path, mmap_mode='r')
+            
+            # Modelos treinados com outro esquema de features não são compatíveis
+            if getattr(modelo, 'feature_schema_', None) != FEATURE_SCHEMA_VERSION:
+                self.logger.warning(
+                    f"Modelo ignorado: esquema de features {getattr(modelo, 'feature_schema_', None)} "
+                    f"diferente do atual ({FEATURE_SCHEMA_VERSION})"
+                )
+                self.modelo = RandomForestRegressor()
+            else:
+                self.modelo = modelo
+                self.versao_modelo = getattr(modelo, 'versao_', 0)
+                self.preditor = self._carregar_preditor(modelo)
+                self.proxy = self._carregar_proxy(modelo)
         else:
             self.modelo = RandomForestRegressor()
+    
+    def atualizar_se_modificado(self) -> bool:
+        """Recarrega o modelo se o arquivo em disco mudou (ex.: treinado por outro processo)"""
+        mtime = os.path.getmtime(self.modelo_path) if os.path.exists(self.modelo_path) else None
+        if mtime == self._modelo_mtime:
+            return False
+        
+        self._carregar_modelo()
+        self._limpar_cache()
+        self.logger.info(f"Modelo recarregado do disco (versão {self.versao_modelo})")
+        return True
+    
+    def _carregar_preditor(self, modelo):
+        """Usa a floresta exportada se for da mesma versão do modelo; caso contrário recompila"""
+        if os.path.exists(self.preditor_path):
+            try:
+                preditor = FlorestaCompilada.carregar(self.preditor_path)
+                if preditor.versao == getattr(modelo, 'versao_', 0):
+                    return preditor if self._verificar_preditor(preditor, modelo) else None
+            except Exception as e:
+                self.logger.error(f"Erro ao carregar floresta compilada: {e}")
+        return self._compilar_preditor(modelo)
+    
+    def _compilar_preditor(self, modelo):
+        """Exporta o RandomForest para vetores contíguos e confere a paridade com o sklearn"""
+        if not hasattr(modelo, 'estimators_'):
+            return None
+        try:
+            preditor = FlorestaCompilada.compilar(modelo)
+            return preditor if self._verificar_preditor(preditor, modelo) else None
+        except Exception as e:
+            self.logger.error(f"Erro ao compilar modelo: {e}")
+            return None
+    
+    def _verificar_preditor(self, preditor, modelo) -> bool:
+        """Teste de paridade com as últimas amostras do histórico (ou amostras sintéticas)"""
+        X, _ = self.historico.carregar_matriz()
+        if len(X) and X.shape[1] == modelo.n_features_in_:
+            amostra = np.array(X[-32:])
+        else:
+            amostra = np.random.default_rng(0).random((32, modelo.n_features_in_)) * 10
+        
+        if not preditor.verificar_paridade(modelo, amostra):
+            self.logger.warning("Floresta compilada divergiu do sklearn; usando predição padrão")
+            return False
+        return True
+    
+    def _carregar_proxy(self, modelo):
+        """Carrega o proxy destilado, se corresponder à versão do modelo"""
+        if not os.path.exists(self.proxy_path):
+            return None
+        try:
+            proxy = ProxyLinear.carregar(self.proxy_path)
+        except Exception as e:
+            self.logger.warning(f"Proxy linear ignorado: {e}")
+            return None
+        return proxy if proxy.versao_modelo == getattr(modelo, 'versao_', 0) else None
+    
+    def _destilar_proxy(self, modelo):
+        """
+        Ajusta e grava o proxy linear do modelo; falhas não impedem a instalação do modelo
+        
+        A destilação usa o histórico completo (ou uma amostra de tamanho fixo dele), e não só
+        os registros do treino incremental, para o proxy imitar o modelo em toda a distribuição.
+        """
+        try:
+            config = _config_treinamento()
+            X, _ = self.historico.carregar_matriz()
+            if len(X) > config['amostras_proxy']:
+                indices = np.sort(np.random.default_rng(42).choice(len(X), config['amostras_proxy'], replace=False))
+                X = X[indices]
+            proxy = ProxyLinear.destilar(modelo, np.array(X), alpha=config['alpha_proxy'])
+            temporario = f'{self.proxy_path}.tmp'
+            proxy.salvar(temporario)
+            os.replace(temporario, self.proxy_path)
+            self.logger.info(f"Proxy linear destilado (R² de fidelidade {proxy.r2_fidelidade:.3f})")
+            return proxy
+        except Exception as e:
+            self.logger.warning(f"Erro ao destilar proxy linear: {e}")
+            return None
+    
+    def _sondar_modelo(self):
+        """Predição mínima usada pelo disjuntor para testar se o modelo voltou a responder"""
+        self._prever_matriz(np.zeros((1, self.feature_processor.num_features), dtype=np.float32))
+    
+    def _prever_matriz(self, matriz: np.ndarray) -> np.ndarray:
+        """Prevê um lote de features no servidor de scoring ou com a floresta compilada, se disponíveis"""
+        if self.cliente_scoring is not None:
+            return self.cliente_scoring.prever(matriz)
+        preditor = self.preditor
+        if preditor is not None:
+            return preditor.predizer(matriz)
+        return np.asarray(self.modelo.predict(matriz), dtype=float)
 
-    def treinar_modelo(self):
-        """Treina o modelo de ML e salva no arquivo"""
-        # Implementação do treinamento do modelo
-        # ...
+    def treinar_modelo(self, incremental: bool = None) -> bool:
+        """
+        Treina o modelo de ML com uma cópia do histórico, valida, salva e troca nas instâncias vivas
+        
+        Os registros são divididos em treino, validação ('validation_size') e teste ('test_size'),
+        frações do total. O novo modelo só é instalado se o R² na validação não for pior que o do
+        modelo atual (com tolerância 'tolerancia_validacao'); o R² de teste é apenas relatado.
+        No modo incremental ('incremental') novas árvores são ajustadas apenas sobre os registros
+        novos e uma janela de replay, mantendo no máximo 'max_arvores'.
+        """
+        config = _config_treinamento()
+        if incremental is None:
+            incremental = config['incremental']
+        
+        X, y = self.historico.carregar_matriz()
+        minimo = config['min_samples_for_training']
+        if len(y) < minimo:
+            self.logger.info(f"Treinamento adiado: {len(y)} registros no histórico (mínimo {minimo})")
+            return False
+        
+        modelo_atual = self.modelo
+        compativel = hasattr(modelo_atual, 'estimators_') and \
+            getattr(modelo_atual, 'n_features_in_', None) == X.shape[1]
+        total_acumulado = self.historico.total_acumulado
+        novos = total_acumulado - getattr(modelo_atual, 'registros_vistos_', total_acumulado)
+        
+        if incremental and compativel and hasattr(modelo_atual, 'registros_vistos_') and novos <= len(y):
+            if novos < minimo:
+                self.logger.info(f"Treinamento incremental adiado: {novos} registros novos")
+                return False
+            
+            # Registros novos + janela de replay dos anteriores (snapshot: o segmento pode ser compactado)
+            inicio = max(0, len(y) - novos - config['janela_replay'])
+            X, y = np.array(X[inicio:]), np.array(y[inicio:])
+            modelo = self._expandir_floresta(modelo_atual, config['arvores_incrementais'])
+        else:
+            # Snapshot do histórico completo: o segmento pode ser compactado durante o treino
+            X, y = np.array(X), np.array(y)
+            modelo = RandomForestRegressor(**ML_CONFIG['model_params'])
+        
+        X_resto, X_teste, y_resto, y_teste = train_test_split(
+            X, y, test_size=config['test_size'], random_state=42
+        )
+        X_treino, X_val, y_treino, y_val = train_test_split(
+            X_resto, y_resto, test_size=config['validation_size'] / (1 - config['test_size']), random_state=42
+        )
+        modelo.fit(X_treino, y_treino)
+        
+        # Limitar o tamanho da floresta descartando as árvores mais antigas
+        max_arvores = config['max_arvores']
+        if len(modelo.estimators_) > max_arvores:
+            modelo.estimators_ = modelo.estimators_[-max_arvores:]
+            modelo.n_estimators = max_arvores
+        
+        # Validar contra o modelo atual antes de substituí-lo
+        r2_novo = r2_score(y_val, modelo.predict(X_val))
+        if compativel:
+            r2_atual = r2_score(y_val, modelo_atual.predict(X_val))
+            tolerancia = config['tolerancia_validacao']
+            if not np.isfinite(r2_novo) or r2_novo < r2_atual - tolerancia:
+                self.logger.warning(
+                    f"Novo modelo rejeitado na validação: R² {r2_novo:.3f} < atual {r2_atual:.3f}"
+                )
+                return False
+        
+        # Marcar o modelo com o esquema de features usado e a nova versão
+        modelo.feature_schema_ = FEATURE_SCHEMA_VERSION
+        modelo.versao_ = self.versao_modelo + 1
+        modelo.r2_validacao_ = float(r2_novo)
+        modelo.r2_teste_ = float(r2_score(y_teste, modelo.predict(X_teste)))
+        modelo.registros_vistos_ = total_acumulado
+        
+        # Gravação atômica (arquivo temporário + rename)
         modelo_path = os.path.join(self.data_path, 'modelo_horario.joblib')
-        joblib.dump(self.modelo, modelo_path)
+        temporario = f'{modelo_path}.tmp'
+        joblib.dump(modelo, temporario)
+        os.replace(temporario, modelo_path)
+        
+        # Exportar a floresta compilada junto com o modelo
+        preditor = self._compilar_preditor(modelo)
+        if preditor is not None:
+            temporario = f'{self.preditor_path}.tmp'
+            preditor.salvar(temporario)
+            os.replace(temporario, self.preditor_path)
+        
+        # Proxy linear para os laços internos, destilado sobre o histórico completo
+        proxy = self._destilar_proxy(modelo)
+        
+        # Hot-swap em todas as instâncias vivas que usam a mesma pasta de dados
+        for instancia in list(_instancias_ativas):
+            if instancia.data_path == self.data_path:
+                instancia._instalar_modelo(modelo, preditor, proxy)
+        
+        self.logger.info(
+            f"Modelo v{modelo.versao_} instalado (R² validação {r2_novo:.3f}, teste {modelo.r2_teste_:.3f})"
+        )
+        return True
+    
+    @staticmethod
+    def _expandir_floresta(modelo_atual, novas_arvores: int):
+        """Cópia rasa do modelo com warm_start para acrescentar árvores sem alterar o modelo em uso"""
+        modelo = copy.copy(modelo_atual)
+        modelo.estimators_ = list(modelo_atual.estimators_)
+        modelo.set_params(warm_start=True, n_estimators=len(modelo.estimators_) + novas_arvores)
+        return modelo
+    
+    def treinar_em_segundo_plano(self) -> bool:
+        """
+        Inicia o retreinamento em uma thread; retorna False se já houver um em andamento
+        
+        Geração de horários e requisições continuam usando o modelo atual até a troca.
+        """
+        with _treinos_lock:
+            thread = _treinos_em_andamento.get(self.data_path)
+            if thread is not None and thread.is_alive():
+                return False
+            
+            thread = threading.Thread(target=self._executar_treino, name='horario-ml-treino', daemon=True)
+            _treinos_em_andamento[self.data_path] = thread
+            thread.start()
+            return True
+    
+    def treino_em_andamento(self) -> bool:
+        """Indica se há um retreinamento em segundo plano para esta pasta de dados"""
+        thread = _treinos_em_andamento.get(self.data_path)
+        return thread is not None and thread.is_alive()
+    
+    def _executar_treino(self):
+        try:
+            self.treinar_modelo()
+        except Exception as e:
+            self.logger.error(f"Erro no retreinamento em segundo plano: {e}")
+    
+    def _instalar_modelo(self, modelo, preditor=None, proxy=None):
+        """Troca o modelo em uso; a versão invalida caches associados ao modelo anterior"""
+        self.preditor = preditor
+        self.proxy = proxy
+        self.modelo = modelo
+        if os.path.exists(self.modelo_path):
+            self._modelo_mtime = os.path.getmtime(self.modelo_path)
+        self.versao_modelo = getattr(modelo, 'versao_', self.versao_modelo + 1)
+        self._limpar_cache()
+        self.circuit_breaker.fechar()
 
     def prever_score(self, horario: Dict[str, Any]) -> float:
         """Prevê o score de um horário usando o modelo treinado"""
@@ -65,33 +401,25 @@ class HorarioML:
         try:
             # Verificar cache
             horario_key = self._gerar_cache_key(horario)
-            if ML_CONFIG['cache']['enabled'] and horario_key in self.cache:
-                self.cache_hits += 1
-                return self.cache[horario_key]
+            score = self._consultar_cache(horario_key)
+            if score is not None:
+                return score
+            
+            if not self.circuit_breaker.permitir():
+                return self._calcular_score_fallback(horario)
             
             # Extrair features
             features = self.feature_processor.extract_features(horario)
             
             # Fazer previsão
-            score = float(self.modelo.predict(features.reshape(1, -1))[0])
+            score = float(self._prever_matriz(features.reshape(1, -1))[0])
+            self.circuit_breaker.registrar_sucesso()
             
             # Atualizar métricas
-            self.metricas['total_predicoes'] += 1
-            self.metricas['melhor_score'] = max(self.metricas['melhor_score'], score)
-            self.metricas['scores_recentes'] = (self.metricas['scores_recentes'][-9:] + [score])
-            
-            # Atualizar tempo médio
-            tempo_predicao = (datetime.now() - inicio).total_seconds()
-            self.metricas['tempo_medio_predicao'] = (
-                (self.metricas['tempo_medio_predicao'] * (self.metricas['total_predicoes'] - 1) +
-                 tempo_predicao) / self.metricas['total_predicoes']
-            )
+            self._atualizar_metricas_predicao([score], (datetime.now() - inicio).total_seconds())
             
             # Armazenar em cache
-            if ML_CONFIG['cache']['enabled']:
-                self.cache[horario_key] = score
-                self.cache_misses += 1
-                self._limpar_cache_se_necessario()
+            self._armazenar_cache(horario_key, score)
             
             # Registrar geração para análise de tendências
             self.treinamento.registrar_geracao(
@@ -104,7 +432,173 @@ class HorarioML:
             
         except Exception as e:
             self.logger.error(f"Erro ao prever score: {e}")
+            self.circuit_breaker.registrar_falha(e)
             return self._calcular_score_fallback(horario)
+    
+    def prever_scores(self, horarios: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Prevê o score de vários horários com uma única chamada ao modelo
+        
+        As features são empilhadas em uma matriz e as métricas são atualizadas uma vez por lote.
+        """
+        if not horarios:
+            return np.zeros(0)
+        if not self.circuit_breaker.permitir():
+            return np.array([self._calcular_score_fallback(horario) for horario in horarios])
+        
+        inicio = datetime.now()
+        
+        try:
+            # Extrair features (apenas dos horários fora do cache) e prever o lote
+            chaves = [self._gerar_cache_key(horario) for horario in horarios]
+            scores = self._prever_lote_com_cache(
+                chaves,
+                lambda faltantes: np.vstack([
+                    self.feature_processor.extract_features(horarios[i]) for i in faltantes
+                ])
+            )
+            self.circuit_breaker.registrar_sucesso()
+            
+            # Atualizar métricas uma vez para o lote
+            self._atualizar_metricas_predicao(scores, (datetime.now() - inicio).total_seconds())
+            
+            # Registrar apenas o melhor horário do lote para análise de tendências
+            melhor = int(np.argmax(scores))
+            self.treinamento.registrar_geracao(
+                horario=horarios[melhor],
+                metricas=self.metricas,
+                tempo_geracao=(datetime.now() - inicio).total_seconds()
+            )
+            
+            return scores
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao prever scores em lote: {e}")
+            self.circuit_breaker.registrar_falha(e)
+            return np.array([self._calcular_score_fallback(horario) for horario in horarios])
+    
+    def prever_scores_grade(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """
+        Prevê scores de um lote de grades [lote, turmas, 5, 7] (IDs de professor/disciplina, -1 = vazio)
+        
+        Evita montar o dicionário do horário: as features são extraídas de forma vetorizada.
+        """
+        if not self.circuit_breaker.permitir():
+            return self._calcular_score_fallback_grade(disciplinas)
+        
+        inicio = datetime.now()
+        
+        try:
+            professores = np.ascontiguousarray(professores, dtype=np.int32)
+            disciplinas = np.ascontiguousarray(disciplinas, dtype=np.int32)
+            chaves = [
+                (self.versao_modelo, 'grade',
+                 hashlib.blake2b(p.tobytes() + d.tobytes(), digest_size=16).digest())
+                for p, d in zip(professores, disciplinas)
+            ]
+            scores = self._prever_lote_com_cache(
+                chaves,
+                lambda faltantes: self.feature_processor.extract_features_grade(
+                    professores[faltantes], disciplinas[faltantes]
+                )
+            )
+            self.circuit_breaker.registrar_sucesso()
+            self._atualizar_metricas_predicao(scores, (datetime.now() - inicio).total_seconds())
+            return scores
+            
+        except Exception as e:
+            self.logger.error(f"Erro ao prever scores das grades: {e}")
+            self.circuit_breaker.registrar_falha(e)
+            return self._calcular_score_fallback_grade(disciplinas)
+    
+    def _gerar_cache_key(self, horario: Dict[str, Any]):
+        """Chave canônica do horário: versão do modelo + hash das aulas ordenadas"""
+        aulas = sorted(
+            (turma, dia, int(hora), str(aula['professor']), str(aula['disciplina']))
+            for turma, dados in horario.items()
+            if turma not in ['_alocacoes_incompletas', '_sugestoes_melhoria']
+            for dia, aulas_dia in dados['dias'].items()
+            for hora, aula in aulas_dia.items()
+            if aula
+        )
+        digest = hashlib.blake2b(repr(aulas).encode(), digest_size=16).digest()
+        return (self.versao_modelo, 'horario', digest)
+    
+    def _consultar_cache(self, chave):
+        """Retorna o score em cache (atualizando a ordem LRU) ou None"""
+        if not ML_CONFIG['cache']['enabled']:
+            return None
+        with self._cache_lock:
+            score = self.cache.get(chave)
+            if score is None:
+                self.cache_misses += 1
+                return None
+            self.cache.move_to_end(chave)
+            self.cache_hits += 1
+            return score
+    
+    def _armazenar_cache(self, chave, score: float):
+        if ML_CONFIG['cache']['enabled']:
+            with self._cache_lock:
+                self.cache[chave] = score
+                self._limpar_cache_se_necessario()
+    
+    def _limpar_cache(self):
+        with self._cache_lock:
+            self.cache.clear()
+    
+    def _limpar_cache_se_necessario(self):
+        """Remove as entradas menos usadas recentemente acima da capacidade (chamar com _cache_lock)"""
+        while len(self.cache) > self.cache_capacidade:
+            self.cache.popitem(last=False)
+            self.cache_evictions += 1
+    
+    def _prever_lote_com_cache(self, chaves: List, calcular_matriz) -> np.ndarray:
+        """Prevê apenas as entradas fora do cache; calcular_matriz recebe os índices faltantes"""
+        scores = np.empty(len(chaves))
+        faltantes = []
+        for i, chave in enumerate(chaves):
+            score = self._consultar_cache(chave)
+            if score is None:
+                faltantes.append(i)
+            else:
+                scores[i] = score
+        
+        if faltantes:
+            scores[faltantes] = self._prever_matriz(calcular_matriz(faltantes))
+            for i in faltantes:
+                self._armazenar_cache(chaves[i], float(scores[i]))
+        
+        return scores
+    
+    def _atualizar_metricas_predicao(self, scores, tempo_total: float):
+        """Atualiza contadores e tempo médio de predição para um lote de scores"""
+        n = len(scores)
+        total_anterior = self.metricas['total_predicoes']
+        self.metricas['total_predicoes'] += n
+        self.metricas['melhor_score'] = max(self.metricas['melhor_score'], float(np.max(scores)))
+        self.metricas['scores_recentes'] = (self.metricas['scores_recentes'] +
+                                            [float(s) for s in scores[-10:]])[-10:]
+        
+        # Tempo médio por horário previsto
+        self.metricas['tempo_medio_predicao'] = (
+            (self.metricas['tempo_medio_predicao'] * total_anterior + tempo_total) /
+            self.metricas['total_predicoes']
+        )
+    
+    def _calcular_score_fallback(self, horario: Dict[str, Any]) -> float:
+        """Score heurístico (0-100) usado quando o modelo não consegue prever"""
+        return 100.0 * self._calcular_compactacao(horario)
+    
+    def _calcular_score_fallback_grade(self, disciplinas: np.ndarray) -> np.ndarray:
+        """Mesmo score heurístico de compactação calculado sobre um lote de grades"""
+        ocupado = np.asarray(disciplinas) >= 0
+        anterior = np.zeros_like(ocupado)
+        anterior[..., 1:] = ocupado[..., :-1]
+        blocos = (ocupado & ~anterior).sum(axis=-1)
+        janelas = np.maximum(blocos - 1, 0).sum(axis=(-2, -1))
+        dias = (blocos > 0).sum(axis=(-2, -1))
+        return np.where(dias > 0, 100.0 * (1 - janelas / np.maximum(dias * 2, 1)), 0.0)
             
     def obter_relatorio_aprendizado(self) -> Dict[str, Any]:
         """Retorna relatório completo sobre o aprendizado do sistema"""
@@ -115,6 +609,9 @@ class HorarioML:
             'cache_efficiency': {
                 'hits': self.cache_hits,
                 'misses': self.cache_misses,
+                'evictions': self.cache_evictions,
+                'tamanho': len(self.cache),
+                'capacidade': self.cache_capacidade,
                 'ratio': self.cache_hits / (self.cache_hits + self.cache_misses) 
                          if (self.cache_hits + self.cache_misses) > 0 else 0
             },
@@ -122,7 +619,9 @@ class HorarioML:
                 'total_predicoes': self.metricas['total_predicoes'],
                 'melhor_score': self.metricas['melhor_score'],
                 'tempo_medio_predicao': self.metricas['tempo_medio_predicao']
-            }
+            },
+            'circuit_breaker': self.circuit_breaker.obter_estado(),
+            'proxy_linear': self.proxy.obter_relatorio() if self.proxy is not None else None
         })
         
         return relatorio
@@ -161,8 +660,7 @@ class HorarioML:
             
             # Preparar dados para salvar
             registro = {
-                'timestamp': datetime.now().isoformat(),
-                'features': features.tolist(),
+                'features': features,
                 'score': float(score),
                 'metricas': {
                     k: float(v) if isinstance(v, (int, float)) else v
@@ -170,22 +668,12 @@ class HorarioML:
                 }
             }
             
-            # Carregar histórico existente
-            historico = []
-            if os.path.exists(self.historico_path):
-                with open(self.historico_path, 'r') as f:
-                    historico = json.load(f)
-            
-            # Adicionar novo registro
-            historico.append(registro)
+            # Acrescentar ao histórico (O(1), sem reler os registros anteriores)
+            self.historico.adicionar(registro['features'], registro['score'], registro['metricas'])
             
-            # Salvar histórico atualizado
-            with open(self.historico_path, 'w') as f:
-                json.dump(historico, f, indent=2)
-            
-            # Verificar se precisa retreinar
-            if len(historico) % ML_CONFIG['training']['retrain_threshold'] == 0:
-                self.treinar_modelo()
+            # Verificar se precisa retreinar (contador mantido pelo histórico)
+            if self.historico.total % ML_CONFIG['training']['retrain_threshold'] == 0:
+                self.treinar_em_segundo_plano()
                 
             # Registrar para análise de tendências
             self.treinamento.registrar_geracao(
@@ -234,23 +722,62 @@ class HorarioML:
         
         return cargas
     
+    def recarregar_lookups(self):
+        """
+        Carrega professores.csv e disciplinas.csv em máscaras booleanas [entidade, 5, 7]
+        
+        Deve ser chamado sempre que as disponibilidades ou restrições forem alteradas.
+        """
+        self.dias_semana = ['seg', 'ter', 'qua', 'qui', 'sex']
+        self.prof_idx, self.disponibilidade = self._carregar_mascara('professores.csv', 'nome', 'd_')
+        self.disc_idx, self.restricoes = self._carregar_mascara('disciplinas.csv', 'disciplina', 'r_')
+        self.analisador = AnalisadorConflitos(self.restricoes)
+    
+    def _carregar_mascara(self, arquivo: str, coluna_chave: str, prefixo: str):
+        """Lê um CSV uma vez e converte as colunas por dia ('1,2,3') em máscara booleana"""
+        indices = {}
+        mascara = np.zeros((0, len(self.dias_semana), 7), dtype=bool)
+        caminho = os.path.join(self.data_path, arquivo)
+        if not os.path.exists(caminho):
+            return indices, mascara
+        
+        try:
+            df = pd.read_csv(caminho).drop_duplicates(subset=[coluna_chave]).set_index(coluna_chave)
+            indices = {chave: i for i, chave in enumerate(df.index)}
+            mascara = montar_mascara(df, list(df.index), prefixo, self.dias_semana)
+        except Exception as e:
+            self.logger.error(f"Erro ao carregar {arquivo}: {e}")
+        
+        return indices, mascara
+    
+    def _indices_aulas(self, horario: Dict[str, Any]):
+        """Índices (professor, disciplina, dia, hora) de todas as aulas; -1 quando desconhecido"""
+        aulas = [
+            (self.prof_idx.get(aula['professor'], -1),
+             self.disc_idx.get(aula['disciplina'], -1),
+             self.dias_semana.index(dia) if dia in self.dias_semana else -1,
+             int(hora) - 1)
+            for turma, dados in horario.items()
+            if turma not in ['_alocacoes_incompletas', '_sugestoes_melhoria']
+            for dia, aulas_dia in dados['dias'].items()
+            for hora, aula in aulas_dia.items()
+            if aula
+        ]
+        indices = np.array(aulas, dtype=np.int64).reshape(-1, 4)
+        validos = (indices[:, 2] >= 0) & (indices[:, 3] >= 0) & (indices[:, 3] < 7)
+        return indices, validos
+    
     def _calcular_satisfacao_professores(self, horario: Dict[str, Any]) -> float:
         """Calcula índice de satisfação dos professores"""
-        total_aulas = 0
-        aulas_preferidas = 0
-        
-        for turma, dados in horario.items():
-            if turma not in ['_alocacoes_incompletas', '_sugestoes_melhoria']:
-                for dia, aulas in dados['dias'].items():
-                    for horario_aula, aula in aulas.items():
-                        if aula:
-                            total_aulas += 1
-                            if self._verificar_preferencia_professor(
-                                aula['professor'], dia, horario_aula
-                            ):
-                                aulas_preferidas += 1
+        indices, validos = self._indices_aulas(horario)
+        if not len(indices):
+            return 0
         
-        return aulas_preferidas / total_aulas if total_aulas > 0 else 0
+        validos &= indices[:, 0] >= 0
+        preferidas = np.zeros(len(indices), dtype=bool)
+        sel = indices[validos]
+        preferidas[validos] = self.disponibilidade[sel[:, 0], sel[:, 2], sel[:, 3]]
+        return float(preferidas.mean())
     
     def _calcular_compactacao(self, horario: Dict[str, Any]) -> float:
         """Calcula índice de compactação do horário"""
@@ -271,89 +798,107 @@ class HorarioML:
     
     def _calcular_aderencia_preferencias(self, horario: Dict[str, Any]) -> float:
         """Calcula aderência às preferências gerais"""
-        total_restricoes = 0
-        restricoes_atendidas = 0
-        
-        for turma, dados in horario.items():
-            if turma not in ['_alocacoes_incompletas', '_sugestoes_melhoria']:
-                for dia, aulas in dados['dias'].items():
-                    for horario_aula, aula in aulas.items():
-                        if aula:
-                            total_restricoes += 1
-                            if self._verificar_restricoes(
-                                aula['disciplina'], dia, horario_aula
-                            ):
-                                restricoes_atendidas += 1
+        indices, validos = self._indices_aulas(horario)
+        if not len(indices):
+            return 0
         
-        return restricoes_atendidas / total_restricoes if total_restricoes > 0 else 0
+        validos &= indices[:, 1] >= 0
+        violadas = np.zeros(len(indices), dtype=bool)
+        sel = indices[validos]
+        violadas[validos] = self.restricoes[sel[:, 1], sel[:, 2], sel[:, 3]]
+        return float(1 - violadas.mean())
     
     def _verificar_preferencia_professor(self, professor: str, dia: str, horario: str) -> bool:
         """Verifica se um horário está nas preferências do professor"""
-        try:
-            df_professores = pd.read_csv(os.path.join(self.data_path, 'professores.csv'))
-            prof_row = df_professores[df_professores['nome'] == professor]
-            
-            if not prof_row.empty:
-                disponibilidade = str(prof_row[f'd_{dia}'].iloc[0])
-                return str(horario) in disponibilidade.split(',')
-            
-            return False
-        except Exception as e:
-            self.logger.error(f"Erro ao verificar preferência: {e}")
+        p = self.prof_idx.get(professor)
+        h = int(horario) - 1
+        if p is None or dia not in self.dias_semana or not 0 <= h < 7:
             return False
+        return bool(self.disponibilidade[p, self.dias_semana.index(dia), h])
     
     def _verificar_restricoes(self, disciplina: str, dia: str, horario: str) -> bool:
         """Verifica se um horário respeita as restrições da disciplina"""
-        try:
-            df_disciplinas = pd.read_csv(os.path.join(self.data_path, 'disciplinas.csv'))
-            disc_row = df_disciplinas[df_disciplinas['disciplina'] == disciplina]
-            
-            if not disc_row.empty:
-                restricoes = str(disc_row[f'r_{dia}'].iloc[0])
-                return str(horario) not in restricoes.split(',')
-            
-            return True
-        except Exception as e:
-            self.logger.error(f"Erro ao verificar restrições: {e}")
+        d = self.disc_idx.get(disciplina)
+        h = int(horario) - 1
+        if d is None or dia not in self.dias_semana or not 0 <= h < 7:
             return True
+        return not self.restricoes[d, self.dias_semana.index(dia), h]
     
     def _analisar_conflitos(self, horario: Dict[str, Any]) -> Dict[str, int]:
         """Analisa e categoriza conflitos no horário"""
-        conflitos = {
-            'sobreposicao_professor': 0,
-            'janela_excessiva': 0,
-            'restricao_violada': 0,
-            'carga_horaria_excedida': 0
+        return self.analisar_conflitos_detalhado(horario)['contagens']
+    
+    def analisar_conflitos_detalhado(self, horario: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Conflitos do horário em uma passagem vetorizada (AnalisadorConflitos)
+        
+        Retorna as contagens por tipo e as células envolvidas com nomes de turma/professor,
+        dia e hora (1-based).
+        """
+        turmas = [t for t in horario.keys() if t not in ['_alocacoes_incompletas', '_sugestoes_melhoria']]
+        professores, disciplinas, nomes_professores = self._horario_para_grade_global(horario, turmas)
+        resultado = self.analisador.analisar(professores, disciplinas)
+        
+        celulas = resultado['celulas']
+        resultado['celulas'] = {
+            'sobreposicao_professor': [
+                {'turma': turmas[t], 'dia': self.dias_semana[d], 'hora': int(h) + 1,
+                 'professor': nomes_professores[professores[t, d, h]]}
+                for t, d, h in celulas['sobreposicao_professor']
+            ],
+            'restricao_violada': [
+                {'turma': turmas[t], 'dia': self.dias_semana[d], 'hora': int(h) + 1}
+                for t, d, h in celulas['restricao_violada']
+            ],
+            'janela_excessiva': [
+                {'professor': nomes_professores[p], 'dia': self.dias_semana[d], 'hora': int(h) + 1}
+                for p, d, h in celulas['janela_excessiva']
+            ],
+            'carga_horaria_excedida': [
+                {'professor': nomes_professores[p], 'dia': self.dias_semana[d]}
+                for p, d in celulas['carga_horaria_excedida']
+            ]
         }
+        return resultado
+    
+    def _horario_para_grade_global(self, horario: Dict[str, Any], turmas: List[str]):
+        """
+        Grades [turmas, 5, 7] com os índices de professores.csv/disciplinas.csv
         
-        for turma, dados in horario.items():
-            if turma not in ['_alocacoes_incompletas', '_sugestoes_melhoria']:
-                for dia, aulas in dados['dias'].items():
-                    # Verificar sobreposições
-                    professores_horario = {}
-                    for horario, aula in aulas.items():
-                        if aula:
-                            prof = aula['professor']
-                            if prof in professores_horario.get(horario, []):
-                                conflitos['sobreposicao_professor'] += 1
-                            professores_horario[horario] = professores_horario.get(horario, []) + [prof]
-                    
-                    # Verificar janelas
-                    horarios = sorted([int(h) for h in aulas.keys()])
-                    for i in range(len(horarios)-1):
-                        if horarios[i+1] - horarios[i] > 1:
-                            conflitos['janela_excessiva'] += 1
-                    
-                    # Verificar restrições
-                    for horario, aula in aulas.items():
-                        if aula:
-                            if not self._verificar_restricoes(aula['disciplina'], dia, horario):
-                                conflitos['restricao_violada'] += 1
-                    
-                    # Verificar carga horária
-                    cargas = self._calcular_cargas_professores(horario)
-                    for prof, carga in cargas.items():
-                        if carga > 4:  # Máximo de 4 aulas por dia
-                            conflitos['carga_horaria_excedida'] += 1
-        
-        return conflitos
\ No newline at end of file
+        Professores e disciplinas desconhecidos recebem índices após os conhecidos (sem restrições).
+        """
+        professores = np.full((len(turmas), len(self.dias_semana), 7), -1, dtype=np.int64)
+        disciplinas = np.full_like(professores, -1)
+        ids_professores = dict(self.prof_idx)
+        ids_disciplinas = dict(self.disc_idx)
+        
+        for t, turma in enumerate(turmas):
+            for dia, aulas in horario[turma]['dias'].items():
+                if dia not in self.dias_semana:
+                    continue
+                d = self.dias_semana.index(dia)
+                for hora, aula in aulas.items():
+                    h = int(hora) - 1
+                    if not aula or not 0 <= h < 7:
+                        continue
+                    professores[t, d, h] = ids_professores.setdefault(aula['professor'], len(ids_professores))
+                    disciplinas[t, d, h] = ids_disciplinas.setdefault(aula['disciplina'], len(ids_disciplinas))
+        
+        nomes_professores = {i: nome for nome, i in ids_professores.items()}
+        return professores, disciplinas, nomes_professores
+
+
+def obter_modelo_compartilhado(data_path: str) -> HorarioML:
+    """
+    Retorna a instância de HorarioML do processo para a pasta de dados
+    
+    O modelo é desserializado uma única vez e recarregado apenas quando o arquivo muda.
+    """
+    with _registro_lock:
+        instancia = _registro_modelos.get(data_path)
+        if instancia is None:
+            instancia = HorarioML(data_path)
+            _registro_modelos[data_path] = instancia
+    
+    instancia.atualizar_se_modificado()
+    return instancia
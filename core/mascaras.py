@@ -0,0 +1,42 @@
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def horas_do_valor(valor, aulas_por_dia: int = 7) -> List[int]:
+    """
+    Horas (1-based) de uma célula d_/r_ ('1;2;3', '1,2', '1.0' ou 'nenhuma')
+
+    Célula vazia (NaN) não tem nenhuma hora: professor indisponível / disciplina sem restrição.
+    """
+    if valor is None or pd.isna(valor):
+        return []
+    horas = []
+    for hora in str(valor).replace(';', ',').split(','):
+        hora = hora.strip()
+        if hora.replace('.', '', 1).isdigit() and 1 <= int(float(hora)) <= aulas_por_dia:
+            horas.append(int(float(hora)))
+    return horas
+
+
+def montar_mascara(df: pd.DataFrame, chaves: Sequence, prefixo: str, dias: Sequence[str],
+                   aulas_por_dia: int = 7) -> np.ndarray:
+    """
+    Máscara booleana [chaves, dias, aulas_por_dia] das colunas '<prefixo><dia>' de df
+
+    :param df: Uma linha por chave, indexado pela chave (nome do professor ou disciplina)
+    :param prefixo: 'd_' (disponibilidade) ou 'r_' (restrição)
+    Chaves ausentes de df e colunas inexistentes ficam sem nenhuma hora marcada.
+    """
+    mascara = np.zeros((len(chaves), len(dias), aulas_por_dia), dtype=bool)
+    for i, chave in enumerate(chaves):
+        if chave not in df.index:
+            continue
+        for d, dia in enumerate(dias):
+            coluna = f'{prefixo}{dia}'
+            if coluna not in df.columns:
+                continue
+            for hora in horas_do_valor(df.at[chave, coluna], aulas_por_dia):
+                mascara[i, d, hora - 1] = True
+    return mascara
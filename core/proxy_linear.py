@@ -0,0 +1,103 @@
+import joblib
+import numpy as np
+from sklearn.linear_model import Ridge
+from sklearn.metrics import r2_score
+
+from .feature_processor import FeatureProcessor, DIAS_SEMANA, FEATURES_DIA
+
+
+class ProxyLinear:
+    def __init__(self, pesos: np.ndarray, intercepto: float, r2_fidelidade: float = float('nan'),
+                 versao_modelo: int = 0):
+        """
+        Aproximação linear do modelo completo, decomponível por turma e por dia
+
+        score ≈ intercepto + Σ_turmas Σ_dias pesos[dia] · bloco[turma, dia], onde bloco são as
+        9 features de FEATURES_DIA da turma no dia. Um movimento que altera apenas uma turma
+        muda só os blocos dessa turma, então a variação do score sai dos blocos afetados.
+
+        :param pesos: Matriz [dias, features do dia]
+        :param r2_fidelidade: R² das predições do proxy contra as do modelo completo (validação)
+        :param versao_modelo: Versão do modelo completo destilado
+        """
+        self.pesos = np.asarray(pesos, dtype=float)
+        self.intercepto = float(intercepto)
+        self.r2_fidelidade = float(r2_fidelidade)
+        self.versao_modelo = int(versao_modelo)
+        self.feature_processor = FeatureProcessor()
+
+    @staticmethod
+    def blocos_do_vetor(X: np.ndarray, feature_processor: FeatureProcessor) -> np.ndarray:
+        """
+        Blocos somados sobre as turmas [n, dias * features do dia] a partir do vetor do esquema
+
+        A soma sobre as turmas é exata: média por turma × número de turmas.
+        """
+        nomes = feature_processor.nomes_features
+        medias = [nomes.index(f'media_{nome}') for nome in feature_processor.nomes_turma]
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        return X[:, medias] * X[:, [nomes.index('num_turmas')]]
+
+    @classmethod
+    def destilar(cls, modelo, X: np.ndarray, alpha: float = 1.0, fracao_validacao: float = 0.2,
+                 semente: int = 42) -> 'ProxyLinear':
+        """
+        Ajusta o proxy (ridge) para imitar as predições de modelo sobre os vetores X do histórico
+
+        :param modelo: Modelo completo (qualquer objeto com predict)
+        :param X: Vetores de features do esquema atual [n, num_features]
+        """
+        feature_processor = FeatureProcessor()
+        Z = cls.blocos_do_vetor(X, feature_processor)
+        alvo = np.asarray(modelo.predict(np.asarray(X)), dtype=float)
+
+        ordem = np.random.default_rng(semente).permutation(len(alvo))
+        num_validacao = int(len(alvo) * fracao_validacao)
+        validacao, treino = ordem[:num_validacao], ordem[num_validacao:]
+
+        ridge = Ridge(alpha=alpha).fit(Z[treino], alvo[treino])
+        r2 = r2_score(alvo[validacao], ridge.predict(Z[validacao])) if num_validacao > 1 else float('nan')
+
+        # Pesos finais ajustados com todos os registros
+        ridge = Ridge(alpha=alpha).fit(Z, alvo)
+        return cls(
+            pesos=ridge.coef_.reshape(len(DIAS_SEMANA), len(FEATURES_DIA)),
+            intercepto=ridge.intercept_,
+            r2_fidelidade=r2,
+            versao_modelo=getattr(modelo, 'versao_', 0)
+        )
+
+    def prever_vetor(self, X: np.ndarray) -> np.ndarray:
+        """Score aproximado a partir de vetores do esquema [n, num_features]"""
+        return self.intercepto + self.blocos_do_vetor(X, self.feature_processor) @ self.pesos.ravel()
+
+    def pontuar_turmas(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """
+        Contribuição de cada turma ao score [..., turmas] a partir das grades [..., turmas, 5, 7]
+
+        Não inclui o intercepto; a variação de um movimento é a diferença das contribuições
+        da(s) turma(s) alterada(s).
+        """
+        blocos = self.feature_processor.extract_blocos_dia(professores, disciplinas)
+        return (blocos * self.pesos).sum(axis=(-2, -1))
+
+    def prever_grade(self, professores: np.ndarray, disciplinas: np.ndarray) -> np.ndarray:
+        """Score aproximado de grades [turmas, 5, 7] ou de lotes [lote, turmas, 5, 7]"""
+        return self.intercepto + self.pontuar_turmas(professores, disciplinas).sum(axis=-1)
+
+    def obter_relatorio(self):
+        return {
+            'versao_modelo': self.versao_modelo,
+            'r2_fidelidade': self.r2_fidelidade,
+            'intercepto': self.intercepto
+        }
+
+    def salvar(self, caminho: str):
+        joblib.dump({
+            'pesos': self.pesos, 'intercepto': self.intercepto,
+            'r2_fidelidade': self.r2_fidelidade, 'versao_modelo': self.versao_modelo
+        }, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str) -> 'ProxyLinear':
+        return cls(**joblib.load(caminho))
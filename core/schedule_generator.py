@@ -11,6 +11,8 @@ from concurrent.futures import ThreadPoolExecutor
 import json
 import traceback
 
+from scheduler.core.mascaras import montar_mascara
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,15 +24,22 @@ logging.basicConfig(
 )
 
 class ScheduleGenerator:
-    def __init__(self, data_path):
+    def __init__(self, data_path, ml_model=None):
         """
         Inicializa o gerador de horários
         
         :param data_path: Caminho para a pasta com arquivos de dados
+        :param ml_model: HorarioML opcional usado para ordenar os slots candidatos de cada aula
         """
         self.data_path = data_path
         self.dias = ['seg', 'ter', 'qua', 'qui', 'sex']
         
+        # Ordenação de slots guiada pelo modelo (IDs inteiros estáveis para as grades)
+        self.ml_model = ml_model
+        self.ids_professores = {}
+        self.ids_disciplinas = {}
+        self.disponibilidade_horas = {}  # professor -> máscara [5, 7] das colunas d_
+        
         # Estado para backtracking
         self.estados_alocacao = []
         self.max_tentativas_backtrack = 5
@@ -137,6 +146,156 @@ class ScheduleGenerator:
         
         return False
     
+    def ordenar_slots(self, turma, disciplina, professor=None):
+        """
+        Gera os slots (dia, posicao) da turma na ordem em que devem ser tentados
+        
+        Sem modelo, a ordem é a fixa seg..sex × 0..6, sem filtro (os chamadores verificam cada
+        slot). Com modelo, primeiro são descartados os slots inviáveis: ocupados na turma, com o
+        professor indisponível no dia/horário ou já em aula em outra turma no mesmo slot (sem
+        professor definido, basta um dos professores da disciplina na turma, e o slot também não
+        pode ter conflito global). Só os viáveis são pontuados, em um único lote (uma grade
+        candidata por slot), e tentados do melhor para o pior; filtro e lote só são recalculados
+        depois que uma aula é efetivamente alocada na turma.
+        
+        :param professor: Professor que dará a aula (padrão: qualquer professor da disciplina na
+                          turma; nas grades candidatas entra o primeiro viável em cada slot)
+        """
+        ordem_fixa = [(dia, posicao) for dia in self.dias for posicao in range(7)]
+        if self.ml_model is None:
+            yield from ordem_fixa
+            return
+        
+        if professor is None:
+            candidatos = list(self.professores_df[
+                (self.professores_df['turma'] == turma) &
+                (self.professores_df['disciplina'] == disciplina)
+            ]['nome'].unique())
+        else:
+            candidatos = [professor]
+        
+        tentados = set()
+        while True:
+            livres = [
+                (dia, posicao) for dia, posicao in ordem_fixa
+                if (dia, posicao) not in tentados and
+                self.grade_horarios_turmas[turma][dia][posicao] is None
+            ]
+            turmas = list(self.grade_horarios_turmas.keys())
+            grades = self._grades_atuais(turmas)
+            slots, professores_slot = self._filtrar_slots_viaveis(
+                turmas.index(turma), livres, candidatos, grades[0], conflito_global=professor is None
+            )
+            if not slots:
+                return
+            
+            slots = self._pontuar_slots(turmas.index(turma), disciplina, slots, professores_slot, grades)
+            ocupados = self._contar_slots_ocupados(turma)
+            for slot in slots:
+                tentados.add(slot)
+                yield slot
+                # Nova alocação na turma: refiltrar e repontuar os slots restantes
+                if self._contar_slots_ocupados(turma) != ocupados:
+                    break
+            else:
+                return
+    
+    def _filtrar_slots_viaveis(self, t, slots, candidatos, professores, conflito_global):
+        """
+        Mantém os slots em que algum candidato pode dar a aula
+        
+        :param t: Índice da turma nas grades
+        :param professores: Grades [turmas, 5, 7] de IDs de professor do estado atual
+        :return: (slots viáveis, ID do primeiro professor viável em cada um; -1 sem candidatos)
+        """
+        if not slots:
+            return [], []
+        
+        d = np.array([self.dias.index(dia) for dia, _ in slots])
+        h = np.array([posicao for _, posicao in slots])
+        viavel = np.ones(len(slots), dtype=bool)
+        if conflito_global:
+            viavel &= ~np.array([bool(self.verificar_conflito_global(posicao)) for posicao in h])
+        
+        if not candidatos:
+            return [slot for slot, ok in zip(slots, viavel) if ok], [-1] * int(viavel.sum())
+        
+        # [candidatos, slots]: disponível no dia/horário e sem aula em outra turma no mesmo slot
+        ids = np.array([self._id_professor(p) for p in candidatos])
+        outras = np.delete(professores, t, axis=0)[:, d, h]
+        ocupado = (outras[None] == ids[:, None, None]).any(axis=1)
+        disponivel = np.stack([self._disponibilidade_professor(p)[d, h] for p in candidatos])
+        pode = disponivel & ~ocupado
+        
+        viavel &= pode.any(axis=0)
+        primeiro = ids[pode.argmax(axis=0)]
+        return [slot for slot, ok in zip(slots, viavel) if ok], primeiro[viavel].tolist()
+    
+    def _disponibilidade_professor(self, professor):
+        """Máscara [5, 7] das colunas d_ do professor (mesmo critério de CodificacaoTurno e HorarioML)"""
+        if professor not in self.disponibilidade_horas:
+            linhas = self.professores_df[self.professores_df['nome'] == professor].head(1).set_index('nome')
+            self.disponibilidade_horas[professor] = montar_mascara(linhas, [professor], 'd_', self.dias)[0]
+        return self.disponibilidade_horas[professor]
+    
+    def _contar_slots_ocupados(self, turma):
+        return sum(
+            aula is not None
+            for grade in self.grade_horarios_turmas[turma].values()
+            for aula in grade
+        )
+    
+    def _pontuar_slots(self, t, disciplina, slots, professores_slot, grades):
+        """Ordena os slots pelo score previsto da grade com a aula inserida (uma chamada em lote)"""
+        if len(slots) < 2:
+            return slots
+        
+        try:
+            professores, disciplinas = grades
+            d = np.array([self.dias.index(dia) for dia, _ in slots])
+            h = np.array([posicao for _, posicao in slots])
+            lote = np.arange(len(slots))
+            
+            lote_professores = np.repeat(professores[None], len(slots), axis=0)
+            lote_disciplinas = np.repeat(disciplinas[None], len(slots), axis=0)
+            lote_professores[lote, t, d, h] = professores_slot
+            lote_disciplinas[lote, t, d, h] = self.ids_disciplinas.setdefault(
+                disciplina, len(self.ids_disciplinas)
+            )
+            
+            scores = self.ml_model.prever_scores_grade(lote_professores, lote_disciplinas)
+            ordem = np.argsort(-np.asarray(scores), kind='stable')
+            return [slots[i] for i in ordem]
+        
+        except Exception as e:
+            logging.warning(f"Ordenação de slots pelo modelo indisponível: {e}")
+            return slots
+    
+    def _id_professor(self, professor):
+        if professor is None:
+            return -1
+        return self.ids_professores.setdefault(professor, len(self.ids_professores))
+    
+    def _grades_atuais(self, turmas):
+        """Grades [turmas, 5, 7] de IDs de professor/disciplina do estado atual (-1 = vazio)"""
+        professores = np.full((len(turmas), len(self.dias), 7), -1, dtype=np.int32)
+        disciplinas = np.full_like(professores, -1)
+        
+        for t, turma in enumerate(turmas):
+            grade = self.grade_horarios_turmas[turma]
+            if not isinstance(grade, dict):
+                continue
+            for d, dia in enumerate(self.dias):
+                for posicao, aula in enumerate(grade.get(dia, [])[:7]):
+                    if aula is None:
+                        continue
+                    professores[t, d, posicao] = self._id_professor(aula.get('professor'))
+                    disciplinas[t, d, posicao] = self.ids_disciplinas.setdefault(
+                        aula.get('disciplina'), len(self.ids_disciplinas)
+                    )
+        
+        return professores, disciplinas
+    
     def alocar_aulas_turma(self, turma):
         """
         Aloca aulas para uma turma específica com verificações rigorosas
@@ -173,40 +332,39 @@ class ScheduleGenerator:
             aulas_alocadas = 0
             
             # Tentar alocar aulas em dias e posições diferentes
-            for dia in self.dias:
-                for posicao in range(7):
-                    # Verificar se já atingiu a carga horária
-                    if aulas_alocadas >= carga_horaria:
-                        break
+            for dia, posicao in self.ordenar_slots(turma, disciplina):
+                # Verificar se já atingiu a carga horária
+                if aulas_alocadas >= carga_horaria:
+                    break
+                
+                # Verificar conflitos globais e na turma
+                if (self.verificar_conflito_global(posicao) or 
+                    self.grade_horarios_turmas[turma][dia][posicao] is not None):
+                    continue
+                
+                # Selecionar professor para a disciplina
+                professor = self.selecionar_professor_para_disciplina(
+                    disciplina, turma, dia, posicao
+                )
+                
+                # Se professor encontrado, alocar aula
+                if professor:
+                    aula = {
+                        'disciplina': disciplina,
+                        'professor': professor,
+                        'turma': turma
+                    }
                     
-                    # Verificar conflitos globais e na turma
-                    if (self.verificar_conflito_global(posicao) or 
-                        self.grade_horarios_turmas[turma][dia][posicao] is not None):
-                        continue
+                    # Registrar alocação
+                    self.grade_horarios_global[dia][posicao] = aula
+                    self.grade_horarios_turmas[turma][dia][posicao] = aula
                     
-                    # Selecionar professor para a disciplina
-                    professor = self.selecionar_professor_para_disciplina(
-                        disciplina, turma, dia, posicao
-                    )
+                    # Marcar disponibilidade do professor
+                    self.disponibilidade_professores[professor][posicao] = True
                     
-                    # Se professor encontrado, alocar aula
-                    if professor:
-                        aula = {
-                            'disciplina': disciplina,
-                            'professor': professor,
-                            'turma': turma
-                        }
-                        
-                        # Registrar alocação
-                        self.grade_horarios_global[dia][posicao] = aula
-                        self.grade_horarios_turmas[turma][dia][posicao] = aula
-                        
-                        # Marcar disponibilidade do professor
-                        self.disponibilidade_professores[professor][posicao] = True
-                        
-                        print(f"✅ AULA ALOCADA: {disciplina} - {professor} - Dia {dia} - Posição {posicao}")
-                        
-                        aulas_alocadas += 1
+                    print(f"✅ AULA ALOCADA: {disciplina} - {professor} - Dia {dia} - Posição {posicao}")
+                    
+                    aulas_alocadas += 1
             
             # Verificar se todas as aulas foram alocadas
             if aulas_alocadas < carga_horaria:
@@ -523,37 +681,36 @@ class ScheduleGenerator:
         
         print(f"\n📚 Alocando {disciplina} para {turma} - CH: {carga_horaria}")
         
+        # Selecionar professores da disciplina na turma
+        professores_disponiveis = self.professores_df[
+            (self.professores_df['disciplina'] == disciplina) &
+            (self.professores_df['turma'] == turma)
+        ]['nome'].unique()
+        
         # Tentar alocar em diferentes dias e horários
-        for dia in self.dias:
-            for posicao in range(7):
-                if aulas_alocadas >= carga_horaria:
-                    break
-                    
-                # Verificar se o slot está livre
-                if (self.verificar_conflito_global(posicao) or 
-                    self.grade_horarios_turmas[turma][dia][posicao] is not None):
-                    continue
-                
-                # Selecionar professor disponível
-                professores_disponiveis = self.professores_df[
-                    (self.professores_df['disciplina'] == disciplina) &
-                    (self.professores_df['turma'] == turma)
-                ]['nome'].unique()
+        for dia, posicao in self.ordenar_slots(turma, disciplina):
+            if aulas_alocadas >= carga_horaria:
+                break
                 
-                professor_alocado = None
-                for professor in professores_disponiveis:
-                    if not self.professor_ja_alocado_no_dia(professor, posicao):
-                        professor_alocado = professor
-                        break
-                
-                if professor_alocado:
-                    # Tentar alocação temporária
-                    if self.tentar_alocacao_temporaria(professor_alocado, disciplina, turma, dia, posicao):
-                        print(f"✅ Aula alocada: {disciplina} - {professor_alocado} - {dia} {posicao+1}ª aula")
-                        aulas_alocadas += 1
-                        self.confirmar_alocacao_temporaria()
-                    else:
-                        self.desfazer_alocacao_temporaria()
+            # Verificar se o slot está livre
+            if (self.verificar_conflito_global(posicao) or 
+                self.grade_horarios_turmas[turma][dia][posicao] is not None):
+                continue
+            
+            professor_alocado = None
+            for professor in professores_disponiveis:
+                if not self.professor_ja_alocado_no_dia(professor, posicao):
+                    professor_alocado = professor
+                    break
+            
+            if professor_alocado:
+                # Tentar alocação temporária
+                if self.tentar_alocacao_temporaria(professor_alocado, disciplina, turma, dia, posicao):
+                    print(f"✅ Aula alocada: {disciplina} - {professor_alocado} - {dia} {posicao+1}ª aula")
+                    aulas_alocadas += 1
+                    self.confirmar_alocacao_temporaria()
+                else:
+                    self.desfazer_alocacao_temporaria()
         
         # Verificar se todas as aulas foram alocadas
         if aulas_alocadas < carga_horaria:
@@ -595,40 +752,39 @@ class ScheduleGenerator:
             print(f"\n📝 Alocando {disciplina} para turma {turma} - CH: {carga_horaria}")
             
             # Tentar alocar cada aula
-            for dia in self.dias:
-                for posicao in range(7):
-                    if aulas_alocadas >= carga_horaria:
-                        break
-                        
-                    # Verificar disponibilidade e restrições
-                    if not self.verificar_disponibilidade_professor(professor, dia, posicao):
-                        continue
-                        
-                    # Verificar se o slot já está ocupado na turma
-                    if self.grade_horarios_turmas[turma][dia][posicao] is not None:
-                        continue
-                        
-                    # Verificar se o professor já está alocado em outra turma no mesmo horário
-                    if self.professor_ja_alocado_em_turmas(professor, posicao, turma):
-                        continue
-                        
-                    # Verificar exceções específicas
-                    if not self.verificar_excecoes_professor(professor, disciplina, turma, dia, posicao):
-                        continue
+            for dia, posicao in self.ordenar_slots(turma, disciplina, professor):
+                if aulas_alocadas >= carga_horaria:
+                    break
                     
-                    # Alocar aula
-                    aula_obj = {
-                        'disciplina': disciplina,
-                        'professor': professor,
-                        'turma': turma
-                    }
+                # Verificar disponibilidade e restrições
+                if not self.verificar_disponibilidade_professor(professor, dia, posicao):
+                    continue
                     
-                    self.grade_horarios_global[dia][posicao] = aula_obj
-                    self.grade_horarios_turmas[turma][dia][posicao] = aula_obj
-                    self.disponibilidade_professores[professor][posicao] = True
+                # Verificar se o slot já está ocupado na turma
+                if self.grade_horarios_turmas[turma][dia][posicao] is not None:
+                    continue
                     
-                    print(f"✅ Aula alocada: {dia} - Horário {posicao + 1}")
-                    aulas_alocadas += 1
+                # Verificar se o professor já está alocado em outra turma no mesmo horário
+                if self.professor_ja_alocado_em_turmas(professor, posicao, turma):
+                    continue
+                    
+                # Verificar exceções específicas
+                if not self.verificar_excecoes_professor(professor, disciplina, turma, dia, posicao):
+                    continue
+                
+                # Alocar aula
+                aula_obj = {
+                    'disciplina': disciplina,
+                    'professor': professor,
+                    'turma': turma
+                }
+                
+                self.grade_horarios_global[dia][posicao] = aula_obj
+                self.grade_horarios_turmas[turma][dia][posicao] = aula_obj
+                self.disponibilidade_professores[professor][posicao] = True
+                
+                print(f"✅ Aula alocada: {dia} - Horário {posicao + 1}")
+                aulas_alocadas += 1
             
             # Se não conseguiu alocar todas as aulas
             if aulas_alocadas < carga_horaria:
@@ -0,0 +1,325 @@
+import os
+import time
+import queue
+import logging
+import secrets
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+from typing import Dict, Any, Optional
+
+import joblib
+import numpy as np
+
+from .floresta_compilada import FlorestaCompilada
+
+
+class ServidorOcupado(RuntimeError):
+    """Fila do servidor de scoring cheia (backpressure): o cliente deve usar o fallback"""
+
+
+class ServidorScoring:
+    def __init__(self,
+                 data_path: str,
+                 authkey: bytes,
+                 endereco: Optional[str] = None,
+                 janela_ms: float = 2.0,
+                 max_lote: int = 512,
+                 max_pendentes: int = 256,
+                 espera_fila: float = 0.05):
+        """
+        Servidor local que mantém o modelo carregado uma vez e agrupa predições em micro-lotes
+
+        Cada conexão envia matrizes de features; o agrupador espera até janela_ms a partir
+        da primeira requisição (ou até max_lote linhas), empilha tudo em uma única predição
+        e devolve a fatia de cada cliente.
+
+        :param authkey: Segredo compartilhado com os clientes; as conexões são autenticadas
+                        antes de qualquer mensagem (pickle) ser lida
+        :param endereco: Caminho do socket Unix (padrão: scoring.sock na pasta de dados)
+        :param janela_ms: Espera máxima para completar um lote
+        :param max_lote: Linhas máximas por predição
+        :param max_pendentes: Requisições na fila antes de recusar novas (backpressure)
+        :param espera_fila: Segundos que uma requisição aguarda vaga na fila antes de ser recusada
+        """
+        if not authkey:
+            raise ValueError("ServidorScoring exige um authkey")
+        self.logger = logging.getLogger(__name__)
+        self.data_path = data_path
+        self.endereco = endereco or endereco_padrao(data_path)
+        self.authkey = authkey
+        self.janela = janela_ms / 1000.0
+        self.max_lote = max_lote
+        self.espera_fila = espera_fila
+        self.modelo_path = os.path.join(data_path, 'modelo_horario.joblib')
+        self.preditor_path = os.path.join(data_path, 'modelo_horario_compilado.joblib')
+
+        self.fila = queue.Queue(maxsize=max_pendentes)
+        self._parar = threading.Event()
+        self._prever = None
+        self._modelo_mtime = None
+
+        self.metricas = {
+            'requisicoes': 0,
+            'linhas': 0,
+            'lotes': 0,
+            'recusadas': 0,
+            'erros': 0,
+            'maior_lote': 0,
+            'tempo_predicao': 0.0,
+            'espera_total': 0.0
+        }
+        self._metricas_lock = threading.Lock()
+
+    def _carregar_modelo(self):
+        """Carrega a floresta compilada (ou o modelo sklearn) e recarrega quando o arquivo muda"""
+        if not os.path.exists(self.modelo_path):
+            raise FileNotFoundError(f"Modelo não encontrado em {self.modelo_path}")
+
+        mtime = os.path.getmtime(self.modelo_path)
+        if self._prever is not None and mtime == self._modelo_mtime:
+            return
+
+        if os.path.exists(self.preditor_path) and os.path.getmtime(self.preditor_path) >= mtime:
+            self._prever = FlorestaCompilada.carregar(self.preditor_path).predizer
+        else:
+            self._prever = joblib.load(self.modelo_path, mmap_mode='r').predict
+        self._modelo_mtime = mtime
+        self.logger.info(f"Servidor de scoring: modelo carregado ({self.modelo_path})")
+
+    def executar(self):
+        """Atende conexões até parar() (bloqueante; normalmente roda em um processo próprio)"""
+        if os.path.exists(self.endereco):
+            os.remove(self.endereco)
+
+        # Socket acessível apenas pelo dono do processo
+        umask_anterior = os.umask(0o077)
+        try:
+            listener = Listener(self.endereco, authkey=self.authkey)
+        finally:
+            os.umask(umask_anterior)
+        os.chmod(self.endereco, 0o600)
+
+        with listener:
+            threading.Thread(target=self._agrupar, daemon=True, name='scoring-lotes').start()
+            self.logger.info(f"Servidor de scoring ouvindo em {self.endereco}")
+
+            while not self._parar.is_set():
+                try:
+                    conexao = listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                    if self._parar.is_set():
+                        break
+                    self.logger.warning(f"Conexão recusada no servidor de scoring: {e}")
+                    continue
+                if self._parar.is_set():
+                    conexao.close()
+                    break
+                threading.Thread(target=self._atender, args=(conexao,), daemon=True).start()
+
+    def parar(self):
+        """Encerra executar(): sinaliza e acorda o accept() com uma conexão própria"""
+        self._parar.set()
+        try:
+            Client(self.endereco, authkey=self.authkey).close()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            pass
+
+    def _atender(self, conexao):
+        """Lê as requisições de uma conexão e as coloca na fila do agrupador"""
+        envio_lock = threading.Lock()
+        try:
+            while True:
+                tipo, dados = conexao.recv()
+
+                if tipo == 'metricas':
+                    with envio_lock:
+                        conexao.send(('ok', self.obter_metricas()))
+                    continue
+
+                X = np.atleast_2d(np.asarray(dados, dtype=np.float32))
+                try:
+                    self.fila.put((conexao, envio_lock, X, time.perf_counter()), timeout=self.espera_fila)
+                except queue.Full:
+                    with self._metricas_lock:
+                        self.metricas['recusadas'] += 1
+                    with envio_lock:
+                        conexao.send(('ocupado', None))
+
+        except (EOFError, OSError):
+            pass
+        finally:
+            conexao.close()
+
+    def _agrupar(self):
+        """Forma lotes a partir da fila e executa uma predição por lote"""
+        while not self._parar.is_set():
+            try:
+                pedidos = [self.fila.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            linhas = len(pedidos[0][2])
+            limite = time.perf_counter() + self.janela
+            while linhas < self.max_lote:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = self.fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                pedidos.append(pedido)
+                linhas += len(pedido[2])
+
+            self._processar_lote(pedidos)
+
+    def _processar_lote(self, pedidos):
+        inicio = time.perf_counter()
+        try:
+            self._carregar_modelo()
+            scores = np.asarray(self._prever(np.vstack([X for _, _, X, _ in pedidos])), dtype=float)
+            respostas = np.split(scores, np.cumsum([len(X) for _, _, X, _ in pedidos])[:-1])
+            respostas = [('ok', r) for r in respostas]
+        except Exception as e:
+            self.logger.error(f"Erro na predição em lote: {e}")
+            respostas = [('erro', str(e))] * len(pedidos)
+            with self._metricas_lock:
+                self.metricas['erros'] += 1
+
+        fim = time.perf_counter()
+        with self._metricas_lock:
+            self.metricas['requisicoes'] += len(pedidos)
+            self.metricas['linhas'] += sum(len(X) for _, _, X, _ in pedidos)
+            self.metricas['lotes'] += 1
+            self.metricas['maior_lote'] = max(self.metricas['maior_lote'], len(pedidos))
+            self.metricas['tempo_predicao'] += fim - inicio
+            self.metricas['espera_total'] += sum(inicio - chegada for _, _, _, chegada in pedidos)
+
+        for (conexao, envio_lock, _, _), resposta in zip(pedidos, respostas):
+            try:
+                with envio_lock:
+                    conexao.send(resposta)
+            except OSError:
+                pass
+
+    def obter_metricas(self) -> Dict[str, Any]:
+        """Contadores do servidor e médias por lote/requisição"""
+        with self._metricas_lock:
+            metricas = dict(self.metricas)
+        lotes = metricas['lotes'] or 1
+        requisicoes = metricas['requisicoes'] or 1
+        metricas.update({
+            'fila': self.fila.qsize(),
+            'requisicoes_por_lote': metricas['requisicoes'] / lotes,
+            'linhas_por_lote': metricas['linhas'] / lotes,
+            'tempo_medio_lote': metricas['tempo_predicao'] / lotes,
+            'espera_media': metricas['espera_total'] / requisicoes
+        })
+        return metricas
+
+
+class ClienteScoring:
+    def __init__(self, endereco: str, authkey: Optional[bytes] = None):
+        """
+        Cliente de um ServidorScoring; pode ser compartilhado entre threads
+
+        Cada thread abre a própria conexão, então requisições concorrentes chegam juntas ao
+        servidor e entram no mesmo micro-lote.
+
+        :param authkey: Segredo do servidor; se omitido, é lido do arquivo de chave ao lado do
+                        socket (gravado por iniciar_servidor_scoring)
+        """
+        self.endereco = endereco
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _requisitar(self, tipo: str, dados=None):
+        try:
+            conexao = getattr(self._local, 'conexao', None)
+            if conexao is None:
+                if self.authkey is None:
+                    self.authkey = ler_chave(self.endereco)
+                conexao = self._local.conexao = Client(self.endereco, authkey=self.authkey)
+            conexao.send((tipo, dados))
+            status, resposta = conexao.recv()
+        except (EOFError, OSError):
+            self.fechar_conexao()
+            raise
+
+        if status == 'ocupado':
+            raise ServidorOcupado("Servidor de scoring sem vagas na fila")
+        if status == 'erro':
+            raise RuntimeError(f"Servidor de scoring: {resposta}")
+        return resposta
+
+    def prever(self, X: np.ndarray) -> np.ndarray:
+        """Prevê um lote [n, features] no servidor"""
+        return self._requisitar('prever', np.ascontiguousarray(X, dtype=np.float32))
+
+    def obter_metricas(self) -> Dict[str, Any]:
+        return self._requisitar('metricas')
+
+    def fechar_conexao(self):
+        """Fecha a conexão da thread atual (a próxima requisição reconecta)"""
+        conexao = getattr(self._local, 'conexao', None)
+        self._local.conexao = None
+        if conexao is not None:
+            conexao.close()
+
+
+def endereco_padrao(data_path: str) -> str:
+    return os.path.join(data_path, 'scoring.sock')
+
+
+def caminho_chave(endereco: str) -> str:
+    return f'{endereco}.key'
+
+
+def gravar_chave(endereco: str, authkey: bytes):
+    """Grava o segredo ao lado do socket, legível apenas pelo dono (0600)"""
+    caminho = caminho_chave(endereco)
+    temporario = f'{caminho}.tmp'
+    descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descritor, 'wb') as f:
+        f.write(authkey)
+    os.replace(temporario, caminho)
+
+
+def ler_chave(endereco: str) -> bytes:
+    with open(caminho_chave(endereco), 'rb') as f:
+        return f.read()
+
+
+def _executar_servidor(data_path: str, endereco: str, authkey: bytes, opcoes: Dict[str, Any]):
+    ServidorScoring(data_path, authkey, endereco=endereco, **opcoes).executar()
+
+
+def iniciar_servidor_scoring(data_path: str,
+                             endereco: Optional[str] = None,
+                             authkey: Optional[bytes] = None,
+                             **opcoes) -> multiprocessing.Process:
+    """
+    Inicia o servidor de scoring em um processo daemon e aguarda o socket ficar disponível
+
+    Sem authkey, um segredo aleatório é gerado e gravado em '<endereco>.key' (0600), de onde
+    os clientes do mesmo usuário o leem.
+
+    :param opcoes: janela_ms, max_lote, max_pendentes, espera_fila (ver ServidorScoring)
+    """
+    endereco = endereco or endereco_padrao(data_path)
+    if authkey is None:
+        authkey = secrets.token_bytes(32)
+        gravar_chave(endereco, authkey)
+    if os.path.exists(endereco):
+        os.remove(endereco)
+    processo = multiprocessing.Process(
+        target=_executar_servidor, args=(data_path, endereco, authkey, opcoes),
+        daemon=True, name='servidor-scoring'
+    )
+    processo.start()
+
+    limite = time.monotonic() + 10
+    while not os.path.exists(endereco) and processo.is_alive() and time.monotonic() < limite:
+        time.sleep(0.01)
+    return processo
@@ -4,15 +4,41 @@ from typing import Dict, List, Any
 from datetime import datetime
 import json
 import os
+import atexit
 import logging
+import threading
+import weakref
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
 
+# Instâncias com dados pendentes são gravadas no encerramento do processo
+_instancias = weakref.WeakSet()
+
+
+@atexit.register
+def _fechar_instancias():
+    for instancia in list(_instancias):
+        instancia.fechar()
+
+
 class TreinamentoContinuo:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, intervalo_flush: float = 5.0):
+        """
+        :param intervalo_flush: Segundos entre gravações do histórico em segundo plano
+        """
         self.data_path = data_path
         self.logger = logging.getLogger(__name__)
         self.historico_path = os.path.join(data_path, 'historico_treinamento.json')
+        self.intervalo_flush = intervalo_flush
+        
+        # Escrita assíncrona: atualizações ficam em memória até o próximo flush
+        self._lock = threading.RLock()
+        # Serializa snapshot + gravação: um flush mais antigo nunca sobrescreve um mais novo
+        self._lock_escrita = threading.Lock()
+        self._pendente = False
+        self._thread_flush = None
+        self._evento_fechar = threading.Event()
+        _instancias.add(self)
         
         # Métricas de aprendizado
         self.metricas = {
@@ -38,47 +64,55 @@ class TreinamentoContinuo:
                 self.logger.error(f"Erro ao carregar histórico: {e}")
     
     def registrar_geracao(self, horario: Dict[str, Any], metricas: Dict[str, Any], tempo_geracao: float):
-        """Registra uma nova geração de horário para análise"""
+        """Registra uma nova geração de horário para análise (sem I/O; gravação em segundo plano)"""
         try:
-            # Atualizar métricas
-            self.metricas['total_exemplos'] += 1
-            
-            # Avaliar sucesso da geração
-            sucesso = self._avaliar_sucesso_geracao(horario, metricas)
-            if sucesso:
-                self.metricas['exemplos_bem_sucedidos'] += 1
-            
-            # Atualizar média de tempo
-            self.metricas['tempo_medio_geracao'] = (
-                (self.metricas['tempo_medio_geracao'] * (self.metricas['total_exemplos'] - 1) +
-                 tempo_geracao) / self.metricas['total_exemplos']
-            )
-            
-            # Registrar score
-            score = self._calcular_score_geracao(horario, metricas)
-            self.metricas['evolucao_scores'].append({
-                'timestamp': datetime.now().isoformat(),
-                'score': score,
-                'sucesso': sucesso
-            })
-            
-            # Registrar distribuição de conflitos
-            self._atualizar_distribuicao_conflitos(metricas)
-            
-            # Calcular melhoria percentual
-            if len(self.metricas['evolucao_scores']) >= 2:
-                scores = [s['score'] for s in self.metricas['evolucao_scores'][-10:]]
-                if len(scores) >= 2:
-                    self.metricas['melhoria_percentual'] = (
-                        (scores[-1] - scores[0]) / scores[0] * 100
-                    )
-            
-            # Salvar histórico atualizado
-            self._salvar_historico()
+            with self._lock:
+                self._registrar_geracao(horario, metricas, tempo_geracao)
+                self._pendente = True
+            self._agendar_flush()
             
         except Exception as e:
             self.logger.error(f"Erro ao registrar geração: {e}")
     
+    def _registrar_geracao(self, horario: Dict[str, Any], metricas: Dict[str, Any], tempo_geracao: float):
+        """Atualiza as métricas em memória"""
+        # Atualizar métricas
+        self.metricas['total_exemplos'] += 1
+        
+        # Avaliar sucesso da geração
+        sucesso = self._avaliar_sucesso_geracao(horario, metricas)
+        if sucesso:
+            self.metricas['exemplos_bem_sucedidos'] += 1
+        
+        # Atualizar média de tempo
+        self.metricas['tempo_medio_geracao'] = (
+            (self.metricas['tempo_medio_geracao'] * (self.metricas['total_exemplos'] - 1) +
+             tempo_geracao) / self.metricas['total_exemplos']
+        )
+        
+        # Registrar score
+        score = self._calcular_score_geracao(horario, metricas)
+        self.metricas['evolucao_scores'].append({
+            'timestamp': datetime.now().isoformat(),
+            'score': score,
+            'sucesso': sucesso
+        })
+        
+        # Registrar distribuição de conflitos
+        self._atualizar_distribuicao_conflitos(metricas)
+        
+        # Calcular melhoria percentual
+        if len(self.metricas['evolucao_scores']) >= 2:
+            scores = [s['score'] for s in self.metricas['evolucao_scores'][-10:]]
+            if len(scores) >= 2:
+                self.metricas['melhoria_percentual'] = (
+                    (scores[-1] - scores[0]) / scores[0] * 100
+                )
+        
+        # Limitar tamanho do histórico em memória
+        if len(self.metricas['evolucao_scores']) > 100:
+            self.metricas['evolucao_scores'] = self.metricas['evolucao_scores'][-100:]
+    
     def _avaliar_sucesso_geracao(self, horario: Dict[str, Any], metricas: Dict[str, Any]) -> bool:
         """Avalia se uma geração foi bem sucedida"""
         # Verificar alocações incompletas
@@ -122,15 +156,54 @@ class TreinamentoContinuo:
                     self.metricas['distribuicao_conflitos'][tipo] = 0
                 self.metricas['distribuicao_conflitos'][tipo] += quantidade
     
-    def _salvar_historico(self):
-        """Salva histórico de treinamento atualizado"""
-        try:
-            # Limitar tamanho do histórico
-            if len(self.metricas['evolucao_scores']) > 100:
-                self.metricas['evolucao_scores'] = self.metricas['evolucao_scores'][-100:]
+    def _agendar_flush(self):
+        """Inicia a thread de gravação se ela não estiver ativa"""
+        with self._lock:
+            if self._thread_flush is None or not self._thread_flush.is_alive():
+                self._thread_flush = threading.Thread(
+                    target=self._loop_flush, name='treinamento-flush', daemon=True
+                )
+                self._thread_flush.start()
+    
+    def _loop_flush(self):
+        """Grava periodicamente enquanto houver atualizações; encerra quando ficar ocioso"""
+        while True:
+            fechando = self._evento_fechar.wait(self.intervalo_flush)
+            if not self.flush() or fechando:
+                with self._lock:
+                    if not self._pendente:
+                        self._thread_flush = None
+                        return
+    
+    def flush(self) -> bool:
+        """Grava as atualizações pendentes; retorna True se algo foi gravado"""
+        with self._lock_escrita:
+            with self._lock:
+                if not self._pendente:
+                    return False
+                conteudo = json.dumps(self.metricas, indent=2)
+                self._pendente = False
             
-            with open(self.historico_path, 'w') as f:
-                json.dump(self.metricas, f, indent=2)
+            # Gravação fora de self._lock: registrar_geracao não espera pelo disco
+            self._salvar_historico(conteudo)
+        return True
+    
+    def fechar(self):
+        """Grava imediatamente o que estiver pendente (chamado também no encerramento do processo)"""
+        self._evento_fechar.set()
+        thread = self._thread_flush
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.intervalo_flush)
+        self.flush()
+        self._evento_fechar.clear()
+    
+    def _salvar_historico(self, conteudo: str):
+        """Salva histórico de treinamento de forma atômica (arquivo temporário + rename)"""
+        try:
+            temporario = f'{self.historico_path}.tmp'
+            with open(temporario, 'w') as f:
+                f.write(conteudo)
+            os.replace(temporario, self.historico_path)
                 
         except Exception as e:
             self.logger.error(f"Erro ao salvar histórico: {e}")
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.codificacao_turno import CodificacaoTurno
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+DIAS_LIVRES = {f'd_{dia}': '1;2;3;4;5;6;7' for dia in ['seg', 'ter', 'qua', 'qui', 'sex']}
+
+
+def _codificacao(disciplinas_df):
+    professores_df = pd.DataFrame([
+        dict(nome='Ana', disciplina='ARTE', turma='1A', carga_horaria=1, **DIAS_LIVRES),
+    ])
+    return CodificacaoTurno(professores_df, {'1A': {'disciplinas': ['ARTE']}}, disciplinas_df)
+
+
+def test_restricao_de_disciplinas_csv_penaliza_dia_restrito():
+    disciplinas_df = pd.DataFrame([
+        {'disciplina': 'ARTE', 'turma': '1A', 'r_seg': '1,2,3,4,5,6,7',
+         'r_ter': None, 'r_qua': None, 'r_qui': None, 'r_sex': None},
+    ])
+    cod = _codificacao(disciplinas_df)
+    opcao = int(cod.opcoes_aula[(0, 0)][0])
+
+    na_segunda = [-1] * cod.num_slots
+    na_segunda[0] = opcao  # seg, 1ª aula
+    na_terca = [-1] * cod.num_slots
+    na_terca[cod.aulas_por_dia] = opcao  # ter, 1ª aula
+
+    assert not cod.avaliar_restricoes(na_segunda)[0]
+    assert cod.avaliar_restricoes(na_terca)[cod.aulas_por_dia]
+    assert cod.analisar_conflitos(na_segunda)['contagens']['restricao_violada'] == 1
+    assert cod.analisar_conflitos(na_terca)['contagens']['restricao_violada'] == 0
+
+    # A busca local tira a aula do dia restrito
+    ganho = cod.busca_local(na_segunda, max_iteracoes=5, tempo_limite=1.0,
+                            peso_disponibilidade=0.4, peso_restricoes=0.3, penalidade_conflito=5.0)
+    assert ganho > 0
+    assert cod.avaliar_restricoes(na_segunda)[np.asarray(na_segunda) >= 0].all()
+
+
+def test_mascara_de_restricoes_do_csv_real_nao_vazia():
+    professores_df = pd.read_csv(os.path.join(DATA_PATH, 'professores_disciplinas_turmas.csv'))
+    disciplinas_df = pd.read_csv(os.path.join(DATA_PATH, 'disciplinas.csv'))
+    restritas = disciplinas_df.dropna(subset=['r_qua'])['disciplina'].iloc[0]
+    turma = professores_df[professores_df['disciplina'] == restritas]['turma'].iloc[0]
+
+    cod = CodificacaoTurno(professores_df, {turma: {'disciplinas': [restritas]}}, disciplinas_df)
+    assert cod.restricoes[cod.disc_idx[restritas], cod.dias.index('qua')].any()
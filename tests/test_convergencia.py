@@ -0,0 +1,43 @@
+from core.convergencia import MonitorConvergencia
+
+
+def _monitor(**kwargs):
+    # Mesmos parâmetros usados por GeneticScheduleOptimizer
+    return MonitorConvergencia(p_crossover=0.8, p_mutacao=0.2, janela=10, tolerancia=0.01,
+                               politica='reiniciar', max_reinicios=2, **kwargs)
+
+
+def test_fitness_constante_para_antes_de_50_geracoes():
+    monitor = _monitor()
+    decisoes = []
+    for geracao in range(50):
+        decisao = monitor.registrar([80.0, 75.0, 70.0])
+        decisoes.append(decisao)
+        if decisao == MonitorConvergencia.PARAR:
+            break
+
+    assert decisoes[-1] == MonitorConvergencia.PARAR
+    assert len(decisoes) < 50
+    assert decisoes.count(MonitorConvergencia.REINICIAR) == 2
+
+
+def test_progresso_zera_a_contagem_de_estagnacao():
+    monitor = _monitor()
+    for geracao in range(15):
+        monitor.registrar([80.0])
+    assert monitor.geracoes_estagnadas > 0 and monitor.p_mutacao > 0.2
+
+    for geracao in range(5):
+        assert monitor.registrar([81.0 + geracao]) == MonitorConvergencia.CONTINUAR
+    assert monitor.geracoes_estagnadas == 0 and monitor.adaptacoes_seguidas == 0
+
+
+def test_estado_restaurado_mantem_contagem():
+    monitor = _monitor()
+    for geracao in range(14):
+        monitor.registrar([80.0])
+
+    restaurado = _monitor()
+    restaurado.restaurar_estado(monitor.obter_estado())
+    assert [restaurado.registrar([80.0]) for _ in range(10)] == \
+        [monitor.registrar([80.0]) for _ in range(10)]
@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from core.floresta_compilada import FlorestaCompilada
+
+
+def _modelo():
+    rng = np.random.default_rng(0)
+    X = rng.random((300, 12))
+    y = X[:, 0] * 10 + np.sin(X[:, 1] * 6) - X[:, 2] * X[:, 3] + rng.normal(0, 0.1, 300)
+    modelo = RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0).fit(X, y)
+    return modelo, rng.random((50, 12))
+
+
+def test_predizer_igual_ao_sklearn_linha_e_lote():
+    modelo, X = _modelo()
+    compilada = FlorestaCompilada.compilar(modelo)
+
+    np.testing.assert_allclose(compilada.predizer(X[:1]), modelo.predict(X[:1]), rtol=0, atol=1e-9)
+    assert abs(compilada.predizer(X[0]) - modelo.predict(X[:1])[0]) <= 1e-9
+    np.testing.assert_allclose(compilada.predizer(X), modelo.predict(X), rtol=0, atol=1e-9)
+
+
+def test_paridade_apos_salvar_e_carregar(tmp_path):
+    modelo, X = _modelo()
+    caminho = os.path.join(tmp_path, 'modelo_compilado.joblib')
+    FlorestaCompilada.compilar(modelo).salvar(caminho)
+    carregada = FlorestaCompilada.carregar(caminho)
+
+    np.testing.assert_allclose(carregada.predizer(X[:1]), modelo.predict(X[:1]), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(carregada.predizer(X), modelo.predict(X), rtol=0, atol=1e-9)
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from core.mascaras import horas_do_valor, montar_mascara
+
+
+def test_horas_do_valor_formatos():
+    assert horas_do_valor('1;2;3') == [1, 2, 3]
+    assert horas_do_valor('4, 5') == [4, 5]
+    assert horas_do_valor(6.0) == [6]
+    assert horas_do_valor('nenhuma') == []
+    assert horas_do_valor('0;8') == []
+    assert horas_do_valor(np.nan) == []
+
+
+def test_montar_mascara_nan_e_chave_ausente_sem_horas():
+    df = pd.DataFrame({'d_seg': ['1;2', np.nan], 'd_ter': [np.nan, '7']}, index=['Ana', 'Bia'])
+    mascara = montar_mascara(df, ['Ana', 'Bia', 'Caio'], 'd_', ['seg', 'ter', 'qua'])
+
+    assert mascara.shape == (3, 3, 7)
+    assert mascara[0, 0, :2].all() and mascara[0].sum() == 2
+    assert mascara[1, 1, 6] and mascara[1].sum() == 1
+    assert not mascara[2].any()
@@ -0,0 +1,32 @@
+import json
+import threading
+import time
+
+from core.treinamento_continuo import TreinamentoContinuo
+
+
+def test_flush_concorrente_nao_grava_snapshot_antigo(tmp_path):
+    treinamento = TreinamentoContinuo(str(tmp_path), intervalo_flush=60)
+    salvar_original = treinamento._salvar_historico
+    gravando = threading.Event()
+
+    def salvar_lento(conteudo):
+        # O primeiro flush demora a gravar enquanto outro registro e outro flush acontecem
+        if json.loads(conteudo)['total_exemplos'] == 1:
+            gravando.set()
+            time.sleep(0.3)
+        salvar_original(conteudo)
+
+    treinamento._salvar_historico = salvar_lento
+    treinamento.registrar_geracao({}, {'total_aulas_alocadas': 10}, 1.0)
+    primeiro = threading.Thread(target=treinamento.flush)
+    primeiro.start()
+    assert gravando.wait(5)
+
+    treinamento.registrar_geracao({}, {'total_aulas_alocadas': 12}, 1.0)
+    treinamento.flush()
+    primeiro.join()
+    treinamento.fechar()
+
+    with open(treinamento.historico_path) as f:
+        assert json.load(f)['total_exemplos'] == 2